@@ -0,0 +1,496 @@
+// A stand in for rippled, for benchmarking the printers offline.
+//
+// The types mirror the layouts (and member names) the printers expect, not
+// rippled's behaviour. Built as `rippled`, so ripplegdb loads for it.
+
+#include <cstdint>
+#include <cstdlib>
+#include <cstring>
+#include <map>
+#include <memory>
+#include <set>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+namespace ripple {
+
+enum SerializedTypeID {
+    STI_NOTPRESENT = 0,
+    STI_UINT16 = 1,
+    STI_UINT32 = 2,
+    STI_UINT64 = 3,
+    STI_HASH128 = 4,
+    STI_HASH256 = 5,
+    STI_AMOUNT = 6,
+    STI_VL = 7,
+    STI_ACCOUNT = 8,
+    STI_OBJECT = 14,
+    STI_ARRAY = 15,
+    STI_UINT8 = 16,
+    STI_HASH160 = 17,
+    STI_PATHSET = 18,
+    STI_VECTOR256 = 19,
+};
+
+enum LedgerEntryType {
+    ltACCOUNT_ROOT = 'a',
+    ltOFFER = 'o',
+    ltRIPPLE_STATE = 'r',
+};
+
+enum TxType {
+    ttPAYMENT = 0,
+    ttOFFER_CREATE = 7,
+    ttTRUST_SET = 20,
+};
+
+enum TER {
+    tecPATH_DRY = 128,
+    tesSUCCESS = 0,
+    terNO_ACCOUNT = -96,
+};
+
+template <std::size_t Bits, class Tag = void>
+class base_uint {
+public:
+    unsigned int pn[Bits / 32];
+};
+
+struct AccountTag;
+struct CurrencyTag;
+
+using uint256 = base_uint<256>;
+using uint160 = base_uint<160>;
+using Account = base_uint<160, AccountTag>;
+using Currency = base_uint<160, CurrencyTag>;
+using Blob = std::vector<unsigned char>;
+
+struct SField {
+    int fieldCode;
+    SerializedTypeID fieldType;
+    int fieldValue;
+    std::string fieldName;
+    std::string rawJsonName;
+};
+
+class STBase {
+public:
+    virtual ~STBase() {}
+    SField const* fName = nullptr;
+};
+
+template <typename Integer>
+class STInteger : public STBase {
+public:
+    Integer value_;
+};
+
+using STUInt8 = STInteger<unsigned char>;
+using STUInt16 = STInteger<std::uint16_t>;
+using STUInt32 = STInteger<std::uint32_t>;
+using STUInt64 = STInteger<std::uint64_t>;
+
+template <std::size_t Bits>
+class STBitString : public STBase {
+public:
+    base_uint<Bits> bitString_;
+};
+
+struct Issue {
+    uint160 currency;
+    uint160 account;
+};
+
+class STAmount : public STBase {
+public:
+    Issue mIssue;
+    std::uint64_t mValue;
+    int mOffset;
+    bool mIsNative;
+    bool mIsNegative;
+};
+
+class STAccount : public STBase {
+public:
+    Blob value;
+};
+
+class STBlob : public STBase {
+public:
+    Blob value;
+};
+
+class STVector256 : public STBase {
+public:
+    std::vector<uint256> mValue;
+};
+
+// boost::ptr_vector, as far as the printers are concerned
+template <class T>
+struct ptr_vector {
+    std::vector<void*> c_;
+};
+
+class STObject : public STBase {
+public:
+    ptr_vector<STBase> mData;
+};
+
+class STLedgerEntry : public STObject {
+public:
+    uint256 mIndex;
+    LedgerEntryType mType;
+};
+
+class STArray : public STBase {};
+class STPathSet : public STBase {};
+
+namespace core {
+class Quality {
+public:
+    std::uint64_t m_value;
+};
+
+class Offer {
+public:
+    std::shared_ptr<STLedgerEntry> m_entry;
+    Quality m_quality;
+};
+}
+
+namespace path {
+struct Node {
+    std::uint16_t uFlags;
+    uint160 account_;
+    uint160 currency_;
+    uint160 issuer_;
+    uint256 offerIndex_;
+    std::shared_ptr<STLedgerEntry> sleOffer;
+};
+}
+
+class PathState {
+public:
+    int mIndex;
+    TER terStatus;
+    std::uint64_t uQuality;
+    STAmount saInReq, saInAct, saInPass;
+    STAmount saOutReq, saOutAct, saOutPass;
+    std::vector<path::Node> nodes_;
+};
+
+} // namespace ripple
+
+namespace Json {
+
+enum ValueType {
+    nullValue = 0,
+    intValue,
+    uintValue,
+    realValue,
+    stringValue,
+    booleanValue,
+    arrayValue,
+    objectValue,
+};
+
+class Value {
+public:
+    class CZString {
+    public:
+        const char* cstr_;
+        int index_;
+        bool operator<(CZString const& other) const {
+            if (cstr_ && other.cstr_)
+                return std::strcmp(cstr_, other.cstr_) < 0;
+            return index_ < other.index_;
+        }
+    };
+    using ObjectValues = std::map<CZString, Value>;
+
+    union ValueHolder {
+        long long int_;
+        unsigned long long uint_;
+        double real_;
+        bool bool_;
+        char* string_;
+        ObjectValues* map_;
+    } value_;
+    ValueType type_;
+};
+
+} // namespace Json
+
+using namespace ripple;
+
+//////////////////////////////////////////////////////////////////////////////
+
+// How many of each bench/gdb_bench.py has to work with
+const int N_VALUES = 20000;
+const int N_OBJECTS = 2000;
+const int N_FIELDS = 12;
+const int N_PATH_STATES = 200;
+const int N_NODES = 6;
+const int N_CONTAINER = 50000;
+
+SField g_sfields[N_FIELDS];
+STAmount* g_amounts;
+STAccount* g_accounts;
+STBlob* g_blobs;
+STVector256* g_vector256s;
+STBitString<256>* g_hash256s;
+STBitString<160>* g_hash160s;
+STBitString<128>* g_hash128s;
+STUInt8* g_uint8s;
+STUInt16* g_uint16s;
+STUInt32* g_uint32s;
+STUInt64* g_uint64s;
+uint160* g_uint160s;
+uint256* g_uint256s;
+Account* g_accountids;
+Currency* g_currencies;
+Blob* g_rawblobs;
+core::Quality* g_qualities;
+STObject* g_objects;
+STLedgerEntry* g_entries;
+core::Offer* g_offers;
+PathState* g_path_states;
+path::Node* g_nodes;
+STArray* g_starrays;
+STPathSet* g_stpathsets;
+Json::Value* g_json_values;
+Json::Value::CZString* g_czstrings;
+
+std::vector<std::uint64_t> g_vector;
+std::vector<STAmount> g_amount_vector;
+std::map<std::uint64_t, std::uint64_t> g_map;
+std::set<std::uint64_t> g_set;
+std::unordered_map<std::uint64_t, std::uint64_t> g_unordered_map;
+
+// Referenced so their DWARF is kept
+LedgerEntryType g_let = ltOFFER;
+TxType g_txt = ttPAYMENT;
+TER g_ter = tesSUCCESS;
+
+static std::uint64_t rng = 0x9e3779b97f4a7c15ull;
+
+static std::uint64_t next() {
+    rng ^= rng << 13;
+    rng ^= rng >> 7;
+    rng ^= rng << 17;
+    return rng;
+}
+
+template <std::size_t Bits, class Tag>
+static void fill(base_uint<Bits, Tag>& u) {
+    for (auto& w : u.pn)
+        w = static_cast<unsigned int>(next());
+}
+
+static void currency(uint160& u, const char* code) {
+    std::memset(u.pn, 0, sizeof(u.pn));
+    std::memcpy(reinterpret_cast<char*>(u.pn) + 12, code, 3);
+}
+
+static void amount(STAmount& a, int i) {
+    a.fName = &g_sfields[i % N_FIELDS];
+    a.mIsNative = i % 5 == 0;
+    a.mIsNegative = i % 7 == 0;
+    a.mValue = 1000000000000000ull + next() % 8999999999999999ull;
+    a.mOffset = -15 + static_cast<int>(next() % 10);
+    if (a.mIsNative) {
+        std::memset(a.mIssue.currency.pn, 0, sizeof(a.mIssue.currency.pn));
+        std::memset(a.mIssue.account.pn, 0, sizeof(a.mIssue.account.pn));
+    } else {
+        currency(a.mIssue.currency, i % 2 ? "USD" : "JPY");
+        fill(a.mIssue.account);
+    }
+}
+
+static void blob(Blob& b, std::size_t n) {
+    b.resize(n);
+    for (auto& c : b)
+        c = static_cast<unsigned char>(next());
+}
+
+static STBase* field(int i) {
+    SField const* sf = &g_sfields[i % N_FIELDS];
+    STBase* made;
+    switch (sf->fieldType) {
+    case STI_AMOUNT: {
+        auto a = new STAmount;
+        amount(*a, i);
+        made = a;
+        break;
+    }
+    case STI_UINT32: {
+        auto u = new STUInt32;
+        u->value_ = static_cast<std::uint32_t>(next());
+        made = u;
+        break;
+    }
+    case STI_UINT16: {
+        auto u = new STUInt16;
+        u->value_ = ltOFFER;
+        made = u;
+        break;
+    }
+    case STI_HASH256: {
+        auto h = new STBitString<256>;
+        fill(h->bitString_);
+        made = h;
+        break;
+    }
+    case STI_ACCOUNT: {
+        auto a = new STAccount;
+        blob(a->value, 20);
+        made = a;
+        break;
+    }
+    default:
+        // A bare STBase, ie. a field that isn't present
+        made = new STBase;
+    }
+    made->fName = sf;
+    return made;
+}
+
+static void object(STObject& o, int i) {
+    for (int f = 0; f < N_FIELDS; ++f)
+        o.mData.c_.push_back(field(i + f));
+}
+
+static void node(path::Node& n) {
+    n.uFlags = 0x31;
+    fill(n.account_);
+    currency(n.currency_, "USD");
+    fill(n.issuer_);
+    fill(n.offerIndex_);
+}
+
+static void json(Json::Value& v, int i) {
+    v.type_ = static_cast<Json::ValueType>(i % 6);
+    switch (v.type_) {
+    case Json::intValue: v.value_.int_ = -i; break;
+    case Json::uintValue: v.value_.uint_ = i; break;
+    case Json::realValue: v.value_.real_ = i / 3.0; break;
+    case Json::stringValue: v.value_.string_ = strdup("bench"); break;
+    case Json::booleanValue: v.value_.bool_ = i % 2; break;
+    default: v.value_.int_ = 0;
+    }
+}
+
+extern "C" __attribute__((noinline)) void bench_ready() {
+    asm volatile("" ::: "memory");
+}
+
+int main() {
+    static const struct {
+        const char* name;
+        SerializedTypeID type;
+    } fields[N_FIELDS] = {
+        {"Amount", STI_AMOUNT},         {"Balance", STI_AMOUNT},
+        {"Flags", STI_UINT32},          {"LedgerEntryType", STI_UINT16},
+        {"Account", STI_ACCOUNT},       {"PreviousTxnID", STI_HASH256},
+        {"Sequence", STI_UINT32},       {"TakerPays", STI_AMOUNT},
+        {"TakerGets", STI_AMOUNT},      {"Destination", STI_ACCOUNT},
+        {"BookDirectory", STI_HASH256}, {"NotPresent", STI_NOTPRESENT},
+    };
+    for (int i = 0; i < N_FIELDS; ++i) {
+        g_sfields[i].fieldCode = i;
+        g_sfields[i].fieldType = fields[i].type;
+        g_sfields[i].fieldName = fields[i].name;
+        g_sfields[i].rawJsonName = fields[i].name;
+    }
+
+    g_amounts = new STAmount[N_VALUES];
+    g_accounts = new STAccount[N_VALUES];
+    g_blobs = new STBlob[N_VALUES];
+    g_vector256s = new STVector256[N_VALUES];
+    g_hash256s = new STBitString<256>[N_VALUES];
+    g_hash160s = new STBitString<160>[N_VALUES];
+    g_hash128s = new STBitString<128>[N_VALUES];
+    g_uint8s = new STUInt8[N_VALUES];
+    g_uint16s = new STUInt16[N_VALUES];
+    g_uint32s = new STUInt32[N_VALUES];
+    g_uint64s = new STUInt64[N_VALUES];
+    g_uint160s = new uint160[N_VALUES];
+    g_uint256s = new uint256[N_VALUES];
+    g_accountids = new Account[N_VALUES];
+    g_currencies = new Currency[N_VALUES];
+    g_rawblobs = new Blob[N_VALUES];
+    g_qualities = new core::Quality[N_VALUES];
+    g_json_values = new Json::Value[N_VALUES];
+    g_czstrings = new Json::Value::CZString[N_VALUES];
+    g_nodes = new path::Node[N_VALUES];
+    g_starrays = new STArray[N_VALUES];
+    g_stpathsets = new STPathSet[N_VALUES];
+
+    for (int i = 0; i < N_VALUES; ++i) {
+        amount(g_amounts[i], i);
+        blob(g_accounts[i].value, 20);
+        blob(g_blobs[i].value, 8 + i % 64);
+        g_vector256s[i].mValue.resize(i % 8);
+        for (auto& h : g_vector256s[i].mValue)
+            fill(h);
+        fill(g_hash256s[i].bitString_);
+        fill(g_hash160s[i].bitString_);
+        fill(g_hash128s[i].bitString_);
+        g_uint8s[i].value_ = static_cast<unsigned char>(i);
+        g_uint16s[i].value_ = static_cast<std::uint16_t>(i);
+        g_uint32s[i].value_ = static_cast<std::uint32_t>(next());
+        g_uint64s[i].value_ = next();
+        fill(g_uint160s[i]);
+        fill(g_uint256s[i]);
+        fill(g_accountids[i]);
+        currency(*reinterpret_cast<uint160*>(&g_currencies[i]), "EUR");
+        blob(g_rawblobs[i], 32);
+        g_qualities[i].m_value = next();
+        json(g_json_values[i], i);
+        g_czstrings[i].cstr_ = i % 2 ? "key" : nullptr;
+        g_czstrings[i].index_ = i;
+        node(g_nodes[i]);
+    }
+
+    g_objects = new STObject[N_OBJECTS];
+    g_entries = new STLedgerEntry[N_OBJECTS];
+    g_offers = new core::Offer[N_OBJECTS];
+    for (int i = 0; i < N_OBJECTS; ++i) {
+        object(g_objects[i], i);
+        object(g_entries[i], i);
+        fill(g_entries[i].mIndex);
+        g_entries[i].mType = ltOFFER;
+        // Not owning, the entries outlive everything
+        g_offers[i].m_entry.reset(&g_entries[i], [](STLedgerEntry*) {});
+        g_offers[i].m_quality.m_value = next();
+    }
+
+    g_path_states = new PathState[N_PATH_STATES];
+    for (int i = 0; i < N_PATH_STATES; ++i) {
+        PathState& ps = g_path_states[i];
+        ps.mIndex = i;
+        ps.terStatus = i % 2 ? tesSUCCESS : tecPATH_DRY;
+        ps.uQuality = next();
+        for (STAmount* a : {&ps.saInReq, &ps.saInAct, &ps.saInPass,
+                            &ps.saOutReq, &ps.saOutAct, &ps.saOutPass})
+            amount(*a, i);
+        ps.nodes_.resize(N_NODES);
+        for (auto& n : ps.nodes_)
+            node(n);
+    }
+
+    for (int i = 0; i < N_CONTAINER; ++i) {
+        std::uint64_t n = next();
+        g_vector.push_back(n);
+        g_map[n] = i;
+        g_set.insert(n);
+        g_unordered_map[n] = i;
+    }
+    g_amount_vector.resize(N_VALUES);
+    for (int i = 0; i < N_VALUES; ++i)
+        amount(g_amount_vector[i], i);
+
+    bench_ready();
+    return static_cast<int>(g_let + g_txt + g_ter);
+}
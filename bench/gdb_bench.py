@@ -0,0 +1,143 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import os
+import json
+import time
+
+# Gdb
+import gdb
+
+# Ours
+import ripplegdb
+
+##################################### DOCS #####################################
+"""
+
+Run by bench/run.py, inside `gdb -batch`, against the fixture's core, after
+ripplegdb is imported. Times formatting values of each RipplePrinter alias,
+and the libcpp container printers, writing the results as json to
+$RIPPLEGDB_BENCH_OUT.
+
+Each case is timed cold (page cache and render memo cleared first) and warm
+(straight after, as when an IDE refreshes).
+
+gdb reports exceptions raised by printers as part of their output, so after
+timing, every value's printer is run directly too, and any exceptions counted
+against the case, so run.py can fail rather than time the error path.
+
+"""
+################################### CONSTANTS ##################################
+
+# alias (or container) -> (array or expression, how many to format)
+CASES = {
+    'ripple::uint160':              ('g_uint160s', 20000),
+    'ripple::Account':              ('g_accountids', 20000),
+    'ripple::Currency':             ('g_currencies', 20000),
+    'ripple::base_uint<256ul, void>': ('g_uint256s', 20000),
+    'ripple::uint256':              ('g_uint256s', 20000),
+    'ripple::Blob':                 ('g_rawblobs', 20000),
+    'ripple::STAmount':             ('g_amounts', 20000),
+    'ripple::STAccount':            ('g_accounts', 20000),
+    'ripple::STBitString<256ul>':   ('g_hash256s', 20000),
+    'ripple::STBitString<160ul>':   ('g_hash160s', 20000),
+    'ripple::STBitString<128ul>':   ('g_hash128s', 20000),
+    'ripple::STUInt8':              ('g_uint8s', 20000),
+    'ripple::STUInt16':             ('g_uint16s', 20000),
+    'ripple::STUInt32':             ('g_uint32s', 20000),
+    'ripple::STUInt64':             ('g_uint64s', 20000),
+    'ripple::STObject':             ('g_objects', 2000),
+    'ripple::STLedgerEntry':        ('g_entries', 2000),
+    'ripple::STArray':              ('g_starrays', 20000),
+    'ripple::STPathSet':            ('g_stpathsets', 20000),
+    'ripple::core::Offer':          ('g_offers', 2000),
+    'ripple::path::Node':           ('g_nodes', 20000),
+    'ripple::STVector256':          ('g_vector256s', 20000),
+    'ripple::STBlob':               ('g_blobs', 20000),
+    'ripple::core::Quality':        ('g_qualities', 20000),
+    'ripple::PathState':            ('g_path_states', 200),
+    'Json::Value':                  ('g_json_values', 20000),
+    'Json::Value::CZString':        ('g_czstrings', 20000),
+
+    'std::vector':                  ('g_vector', 1),
+    'std::vector<STAmount>':        ('g_amount_vector', 1),
+    'std::map':                     ('g_map', 1),
+    'std::set':                     ('g_set', 1),
+    'std::unordered_map':           ('g_unordered_map', 1),
+}
+
+SETTINGS = ('set height 0',
+            'set width 0',
+            'set print elements unlimited',
+            'set print repeats unlimited',
+            'set pagination off')
+
+##################################### CASES ####################################
+
+def values_for(expression, count):
+    'The values to format, built before timing starts'
+    base = gdb.parse_and_eval(expression)
+    if count == 1:
+        return [base]
+    return [base[i] for i in range(count)]
+
+def clear_caches():
+    ripplegdb.values.page_cache.clear()
+    ripplegdb.printers.render_memo.clear()
+
+def time_formatting(values):
+    started = time.perf_counter()
+    for val in values:
+        str(val)
+    return time.perf_counter() - started
+
+def printer_errors(values):
+    '(count, first message) of exceptions raised by the values\' printers'
+    errors, first = 0, None
+    for val in values:
+        try:
+            printer = gdb.default_visualizer(val)
+            if printer is None:
+                raise LookupError('no printer for %s' % val.type)
+            printer.to_string()
+            if hasattr(printer, 'children'):
+                for (_, child) in printer.children():
+                    str(child)
+        except Exception as e:
+            errors += 1
+            first = first or '%s: %s' % (type(e).__name__, e)
+    return (errors, first)
+
+def run_case(expression, count):
+    values = values_for(expression, count)
+    clear_caches()
+    cold = time_formatting(values)
+    warm = time_formatting(values)
+    (errors, first_error) = printer_errors(values)
+    return dict(count=count,
+                cold_ms=cold * 1000,
+                warm_ms=warm * 1000,
+                cold_us_each=cold * 1e6 / count,
+                printer_errors=errors,
+                first_error=first_error)
+
+def main():
+    for setting in SETTINGS:
+        gdb.execute(setting)
+
+    results = dict(cases={}, skipped=[], errors={})
+    aliases = set(ripplegdb.printers.RipplePrinter.aliases)
+
+    for name in sorted(CASES):
+        (expression, count) = CASES[name]
+        try:
+            results['cases'][name] = run_case(expression, count)
+        except gdb.error as e:
+            results['errors'][name] = str(e)
+
+    results['skipped'] = sorted(aliases - set(CASES))
+
+    with open(os.environ['RIPPLEGDB_BENCH_OUT'], 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+#################################### IMPORTS ###################################
+
+# Std Lib
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+##################################### DOCS #####################################
+"""
+
+Benchmarks the printers against a core of bench/fixture.cpp, a stand in for
+rippled with the same member names and tens of thousands of instances.
+
+    python3 bench/run.py --save-baseline    # once, on a quiet machine
+    python3 bench/run.py                    # after a change
+
+Compares against bench/baseline.json, exiting non zero when any case got
+slower than --tolerance times its baseline, or any printer raised. Baselines
+are per machine, so aren't committed.
+
+Needs g++ and a gdb built with python 3.
+
+"""
+################################### CONSTANTS ##################################
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+
+FIXTURE = os.path.join(HERE, 'fixture.cpp')
+GDB_BENCH = os.path.join(HERE, 'gdb_bench.py')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+#################################### BUILDING ##################################
+
+def run(argv, **kw):
+    print('+', ' '.join(argv))
+    subprocess.check_call(argv, **kw)
+
+def build(cxx, build_dir):
+    # Named rippled, as that's what ripplegdb waits for
+    binary = os.path.join(build_dir, 'rippled')
+    if (not os.path.exists(binary) or
+            os.path.getmtime(binary) < os.path.getmtime(FIXTURE)):
+        run([cxx, '-g', '-O0', '-std=c++14', FIXTURE, '-o', binary])
+    return binary
+
+def make_core(gdb, binary, build_dir):
+    core = os.path.join(build_dir, 'core')
+    if (not os.path.exists(core) or
+            os.path.getmtime(core) < os.path.getmtime(binary)):
+        run([gdb, '-batch', '-nx',
+             '-ex', 'break bench_ready',
+             '-ex', 'run',
+             '-ex', 'generate-core-file %s' % core,
+             '-ex', 'kill',
+             binary], stdout=subprocess.DEVNULL)
+    return core
+
+################################### MEASURING ##################################
+
+def measure(gdb, binary, core):
+    with tempfile.NamedTemporaryFile(suffix='.json') as out:
+        env = dict(os.environ, RIPPLEGDB_BENCH_OUT=out.name)
+        run([gdb, '-batch', '-nx',
+             '-ex', 'python import sys; sys.path.insert(0, %r)' % REPO,
+             '-ex', 'python import ripplegdb',
+             '-x', GDB_BENCH,
+             binary, core], env=env, stdout=subprocess.DEVNULL)
+        return json.load(out)
+
+def best_of(runs):
+    'Per case, the run with the lowest cold time'
+    best = runs[0]
+    for results in runs[1:]:
+        for (name, case) in results['cases'].items():
+            known = best['cases'].get(name)
+            if known is None or case['cold_ms'] < known['cold_ms']:
+                best['cases'][name] = case
+    return best
+
+def compare(results, baseline, tolerance):
+    'Prints a table, returning the names of the cases that regressed'
+    regressed = []
+    print('%-34s %10s %10s %10s %8s' % ('case', 'cold ms', 'warm ms',
+                                        'base ms', 'ratio'))
+    for name in sorted(results['cases']):
+        case = results['cases'][name]
+        base = baseline.get('cases', {}).get(name)
+        ratio = case['cold_ms'] / base['cold_ms'] if base and \
+                                                     base['cold_ms'] else None
+        flag = ''
+        if ratio is not None and ratio > tolerance:
+            regressed.append(name)
+            flag = '  SLOWER'
+        print('%-34s %10.1f %10.1f %10s %8s%s' % (
+              name, case['cold_ms'], case['warm_ms'],
+              '%.1f' % base['cold_ms'] if base else '-',
+              '%.2f' % ratio if ratio is not None else '-', flag))
+
+    for (name, error) in sorted(results['errors'].items()):
+        print('%-34s error: %s' % (name, error))
+    for name in failing(results):
+        case = results['cases'][name]
+        print('%-34s %d printer errors, eg. %s' % (
+              name, case['printer_errors'], case['first_error']))
+    if results['skipped']:
+        print('no case for:', ', '.join(results['skipped']))
+    return regressed
+
+def failing(results):
+    'The cases whose printers raised'
+    return sorted(name for (name, case) in results['cases'].items()
+                  if case.get('printer_errors'))
+
+##################################### MAIN #####################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the printers against the fixture core')
+    parser.add_argument('--gdb', default='gdb')
+    parser.add_argument('--cxx', default='g++')
+    parser.add_argument('--build-dir', default=os.path.join(HERE, 'build'))
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='slowdown (cold time ratio) that fails')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.build_dir, exist_ok=True)
+    binary = build(args.cxx, args.build_dir)
+    core = make_core(args.gdb, binary, args.build_dir)
+    results = best_of([measure(args.gdb, binary, core)
+                       for _ in range(args.repeat)])
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+
+    regressed = compare(results, baseline, args.tolerance)
+    errored = failing(results) or results['errors']
+
+    if errored:
+        # Timings of printers failing aren't worth keeping
+        print('printers raised, see above')
+        return 1
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print('saved', args.baseline)
+        return 0
+    return 1 if regressed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
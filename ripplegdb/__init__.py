@@ -2,8 +2,13 @@
 
 # Std Lib
 import os
+import ast
+import sys
+import time
 import importlib
 
+from collections import OrderedDict
+
 #################################### VERSION ###################################
 
 __version__ = '0.0.1'
@@ -14,17 +19,32 @@ __version__ = '0.0.1'
 # Dependency (stable) sorted, ie. don't introduce circular idiocy
 MODULE_LOAD_ORDER = '''\
 base58
+corefile
+helpers
+values
+diskcache
 enums
 types
-values
-helpers
+budget
+decoders
+memscan
+vtables
+heap
+stacks
+profiler
 printers
+tracing
+stats
 commands
 funcs
 '''
 #reloadwatcher
 #websockets
 
+# By default gdb.Type objects are only looked up when first needed, set
+# RIPPLEGDB_EAGER=1 to resolve (and so validate) them all at load time.
+LAZY = not os.environ.get('RIPPLEGDB_EAGER')
+
 ##################################### INIT #####################################
 '''
 
@@ -36,10 +56,121 @@ the gdb module can't be imported.
 try:              loaded
 except NameError: loaded  = 0
 
+# module name -> seconds spent (re)loading it, most recent load only
+load_times = OrderedDict()
+
+def timed(name, f, *args):
+    started = time.perf_counter()
+    try:
+        return f(*args)
+    finally:
+        load_times[name] = time.perf_counter() - started
+
 def do_imports():
     mods = ['ripplegdb.%s' % m for m in MODULE_LOAD_ORDER.split()]
-    loaded = [importlib.import_module(m) for m in mods]
-    return lambda: [importlib.reload(m) for m in loaded]
+    loaded = [timed(m, importlib.import_module, m) for m in mods]
+    return lambda: [timed(m.__name__, importlib.reload, m) for m in loaded]
+
+################################ PARTIAL RELOADS ###############################
+
+# Not in MODULE_LOAD_ORDER, as init() imports and registers it itself
+LIBCPP = 'libcpp'
+
+def reloadable_modules():
+    return [LIBCPP] + MODULE_LOAD_ORDER.split()
+
+def module_path(name):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        name + '.py')
+
+def imported_siblings(name, candidates):
+    'The ripplegdb modules `name` imports, or reaches via ripplegdb.<mod>'
+
+    with open(module_path(name)) as fh:
+        tree = ast.parse(fh.read())
+
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module:
+            if node.module == 'ripplegdb':
+                found.update(a.name for a in node.names)
+            elif node.module.startswith('ripplegdb.'):
+                found.add(node.module.split('.')[1])
+        elif isinstance(node, ast.Import):
+            found.update(a.name.split('.')[1] for a in node.names
+                         if a.name.startswith('ripplegdb.'))
+        elif (isinstance(node, ast.Attribute) and
+              isinstance(node.value, ast.Name) and
+              node.value.id == 'ripplegdb'):
+            found.add(node.attr)
+
+    return (found & set(candidates)) - set([name])
+
+def module_dependencies():
+    names = reloadable_modules()
+    return dict((n, imported_siblings(n, names)) for n in names)
+
+def dependency_order(deps):
+    'Topologically sorted, otherwise keeping MODULE_LOAD_ORDER'
+    ordered, seen = [], set()
+
+    def visit(name):
+        if name not in seen:
+            seen.add(name)
+            for dep in sorted(deps[name], key=reloadable_modules().index):
+                visit(dep)
+            ordered.append(name)
+
+    for name in reloadable_modules():
+        visit(name)
+    return ordered
+
+def modules_to_reload(changed, deps=None):
+    'The changed modules, and everything (transitively) importing them'
+    deps = deps or module_dependencies()
+    stale = set(n for n in changed if n in deps)
+
+    grew = True
+    while grew:
+        dependents = set(n for n, d in deps.items() if d & stale)
+        grew = not dependents <= stale
+        stale |= dependents
+
+    return [n for n in dependency_order(deps) if n in stale]
+
+def reload_changed(paths):
+    '''
+
+    Reloads only the modules whose source changed, and their dependents,
+    leaving everything else (and whatever it has cached) untouched.
+
+    Falls back to a full reload when the package itself changed.
+
+    '''
+    changed = set(os.path.splitext(os.path.basename(p))[0] for p in paths
+                  if p.endswith('.py'))
+
+    if '__init__' in changed:
+        return gdb.execute('rlr', from_tty=False)
+
+    names = [n for n in modules_to_reload(changed)
+             if 'ripplegdb.' + n in sys.modules]
+    if not names:
+        return
+
+    gdb.write("Reloading %s..." % ', '.join(names))
+    for name in names:
+        module = sys.modules['ripplegdb.' + name]
+        timed(module.__name__, importlib.reload, module)
+        if name == LIBCPP:
+            reregister_libstdcxx_printers(module)
+    gdb.write("done.\n")
+
+def reregister_libstdcxx_printers(libcpp):
+    gdb.pretty_printers[:] = [
+        p for p in gdb.pretty_printers
+        if getattr(p, 'name', None) != libcpp.libstdcxx_printer.name]
+    libcpp.register_libstdcxx_printers(None)
 
 def init():
     global hook_remover
@@ -63,7 +194,8 @@ def init():
         gdb.write("%soading ripplegdb..." % ('Rel' if reloading else 'L'))
 
         if reloading: reload_imported()
-        else:         register_libstdcxx_printers(None)
+        else:         timed('register libstdc++ printers',
+                            register_libstdcxx_printers, None)
 
         gdb.write("done.\n")
 
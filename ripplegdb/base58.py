@@ -2,6 +2,7 @@
 
 import hashlib
 import base64
+import functools
 
 ############################### HASHING FUNCTIONS ##############################
 
@@ -23,29 +24,42 @@ def byte_chr(o):
 
 alphabet = b'rpshnaf39wBUDNEGHJKLM4PQRST7VWXYZ2bcdeCg65jkm8oFqi1tuvAxyz'
 
+# Two digits per big int divmod, looked up from a table, rather than one
+PAIRS = [bytes((alphabet[i // 58], alphabet[i % 58])) for i in range(58 * 58)]
+
+ACCOUNT_MEMO_SIZE = 8192
+
 def base58_encode(n):
-    l = []
+    pairs = []
     while n > 0:
-        n, r = divmod(n, 58)
-        l.append(alphabet[r])
-    return bytes(reversed(l))
+        n, r = divmod(n, 58 * 58)
+        pairs.append(PAIRS[r])
+    # The most significant pair may carry a leading zero digit
+    return b''.join(reversed(pairs)).lstrip(alphabet[:1])
 
 def base58_encode_padded(s):
-    n = int(base64.b16encode(s), 16)
-    res = base58_encode(n)
-    pad = 0
-    for c in s:
-        if c == 0:
-            pad += 1
-        else:
-            break
-    return bytes([alphabet[0]] * pad) + res
+    res = base58_encode(int.from_bytes(s, 'big'))
+    pad = len(s) - len(s.lstrip(b'\x00'))
+    return alphabet[:1] * pad + res
 
 def base58_check_encode(s, version=0):
     vs = bytes((version, )) + s
     check = dhash(vs)[:4]
     return str(base58_encode_padded(vs + check), 'ascii')
 
+@functools.lru_cache(maxsize=ACCOUNT_MEMO_SIZE)
+def encode_account_id(raw):
+    '''
+
+    base58_check_encode memoized on the raw 20 bytes, as order books and the
+    like print the same few issuers over and over.
+
+    '''
+    return base58_check_encode(raw)
+
+def encode_account_ids(ids):
+    return [encode_account_id(bytes(raw)) for raw in ids]
+
 def base58_decode(s):
     n = 0
     for ch in s:
@@ -81,4 +95,5 @@ account_1_base58 = 'rrrrrrrrrrrrrrrrrrrrBZbvji'
 
 assert account_1 == account_1
 assert base58_check_encode(account_1) == account_1_base58
+assert encode_account_ids([account_1]) == [account_1_base58]
 assert base58_check_decode(account_1_base58) == account_1
\ No newline at end of file
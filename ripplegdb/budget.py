@@ -0,0 +1,116 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import re
+import time
+import collections
+
+##################################### DOCS #####################################
+"""
+
+Per value time and element budgets, so a corrupted STObject or PathState in a
+crashed process (eg. a field vector with a garbage length) gets cut short,
+rather than freezing `bt full` while we walk garbage pointers.
+
+Printers that loop make a Tracker per value, and tick() it per element. Once
+over budget it raises OverBudget, which the printer turns into a truncated
+marker showing the raw address and type. Over budget events are counted per
+type, see `set ripple-printers budget`.
+
+Only the element limit is on by default. Time is opt in (eg. `set
+ripple-printers budget 50ms`), as it depends on the target, and how warm the
+page cache is, so the same value could print whole one time and truncated
+the next. Printers which yield pause() the clock while suspended, so gdb
+printing their children (or waiting at the pager) isn't charged to them.
+
+"""
+################################### CONSTANTS ##################################
+
+# Time is opt in, see DOCS
+DEFAULT_SECONDS = 0
+DEFAULT_ELEMENTS = 10000
+
+DURATION_RX = re.compile(r'^(\d+(?:\.\d+)?)(us|ms|s)?$')
+UNITS = dict(us=1e-6, ms=1e-3, s=1.0)
+
+#################################### LIMITS ####################################
+
+# 0 is unlimited. Both survive reloads.
+try:
+    limits
+except NameError:
+    limits = dict(seconds=DEFAULT_SECONDS, elements=DEFAULT_ELEMENTS)
+    over_budget = collections.Counter()
+
+def parse_seconds(text):
+    'eg. 50ms, 1.5s or 250us, with plain numbers being ms'
+    if text in ('unlimited', 'off'):
+        return 0
+    match = DURATION_RX.match(text.strip().lower())
+    if match is None:
+        raise ValueError('bad duration %s, expected eg. 50ms' % text)
+    return float(match.group(1)) * UNITS[match.group(2) or 'ms']
+
+def parse_elements(text):
+    if text in ('unlimited', 'off'):
+        return 0
+    return int(text)
+
+def describe():
+    seconds, elements = limits['seconds'], limits['elements']
+    return '%s per value, %s elements' % (
+           '%gms' % (seconds * 1000) if seconds else 'unlimited time',
+           elements or 'unlimited')
+
+#################################### TRACKING ##################################
+
+class OverBudget(Exception):
+    pass
+
+class Tracker:
+    'The budget of one value, named `what` (eg. its type) when exceeded'
+
+    def __init__(self, what):
+        self.what = what
+        self.started = time.perf_counter()
+        self.spent = 0.0
+        self.elements = 0
+
+    def pause(self):
+        'Stops the clock, eg. while suspended at a yield'
+        self.spent += time.perf_counter() - self.started
+        self.started = None
+
+    def resume(self):
+        self.started = time.perf_counter()
+
+    def elapsed(self):
+        'Seconds spent on the value, not counting paused time'
+        if self.started is None:
+            return self.spent
+        return self.spent + time.perf_counter() - self.started
+
+    def allowed(self, count):
+        'How many of count more elements fit in the budget'
+        if not limits['elements']:
+            return count
+        return max(0, min(count, limits['elements'] - self.elements))
+
+    def tick(self, n=1):
+        self.elements += n
+        if limits['elements'] and self.elements > limits['elements']:
+            self.exceeded('%d elements' % limits['elements'])
+        seconds = limits['seconds']
+        if seconds and self.elapsed() > seconds:
+            self.exceeded('%gms' % (seconds * 1000))
+
+    def exceeded(self, reason):
+        over_budget[self.what] += 1
+        raise OverBudget(reason)
+
+def truncations():
+    'How many values have gone over budget, to tell if a render was cut short'
+    return sum(over_budget.values())
+
+def truncated(reason, t, address):
+    return '<truncated after %s: (%s *) 0x%x>' % (reason, t, address or 0)
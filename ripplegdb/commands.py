@@ -19,6 +19,7 @@ from gdb import PARAM_ENUM
 
 # Ours
 import ripplegdb
+from ripplegdb import corefile
 from ripplegdb.enums import all_enums
 
 ################################### CONSTANTS ##################################
@@ -54,6 +55,17 @@ def command(name='', class_=gdb.COMMAND_OBSCURE):
 
 @command('rlr')
 def reload_ripplegdb(arg=None, from_tty=None):
+    '''
+
+    Reloads ripplegdb: rlr [module ...]
+
+    With module names (eg. `rlr printers`) only those, and the modules which
+    import them, are reloaded.
+
+    '''
+    if arg and arg.strip():
+        return ripplegdb.reload_changed([m + '.py' for m in arg.split()])
+
     try:
         ripplegdb.helpers.reload_module(ripplegdb)
     except:
@@ -132,9 +144,19 @@ def launch_ipython():
 
 @command('set ripple-printers')
 def set_printer_status(value, from_tty):
-    'Enable pretty printers for ripple types when using (p)rint'
+    '''
+
+    Enable pretty printers for ripple types when using (p)rint, or set the
+    time and element budget of each printed value (0 is unlimited):
+
+        set ripple-printers [on|off|toggle]
+        set ripple-printers budget [TIME [ELEMENTS]]    eg. budget 50ms 1000
+
+    '''
     value = value.strip().lower()
 
+    if value.startswith('budget'):
+        return set_printer_budget(gdb.string_to_argv(value)[1:])
     if value == 'toggle':
         PP.on = not PP.on
     elif value:
@@ -142,6 +164,23 @@ def set_printer_status(value, from_tty):
 
     print('ripple-printers', 'enabled' if PP.on else 'disabled')
 
+def set_printer_budget(argv):
+    budget = ripplegdb.budget
+    if len(argv) > 2:
+        raise gdb.GdbError('usage: set ripple-printers budget '
+                           '[TIME [ELEMENTS]]')
+    try:
+        if argv:
+            budget.limits['seconds'] = budget.parse_seconds(argv[0])
+        if len(argv) > 1:
+            budget.limits['elements'] = budget.parse_elements(argv[1])
+    except ValueError as e:
+        raise gdb.GdbError(str(e))
+
+    print('ripple-printers budget:', budget.describe())
+    for (t, n) in budget.over_budget.most_common():
+        print('  %6d over budget  %s' % (n, t))
+
 @command('trp')
 def toggle_ripple_printers(value, from_tty):
     gdb.execute('set ripple-printers toggle')
@@ -149,3 +188,485 @@ def toggle_ripple_printers(value, from_tty):
 @command('reset_term')
 def toggle_ripple_printers(value, from_tty):
     os.system('reset')
+
+@command('rcache')
+def memory_cache(arg, from_tty):
+    '''
+
+    Inferior memory page cache, and the memo of rendered ripple values:
+
+        rcache [stats|clear|reset|on|off]
+
+    '''
+    cache = ripplegdb.values.page_cache
+    memo = ripplegdb.printers.render_memo
+    arg = arg.strip().lower() or 'stats'
+
+    if arg == 'clear':
+        cache.clear()
+        memo.clear()
+    elif arg == 'reset':
+        cache.reset_stats()
+        memo.reset_stats()
+    elif arg in ('on', 'off'):
+        cache.enabled = memo.enabled = arg == 'on'
+        cache.clear()
+        memo.clear()
+    elif arg != 'stats':
+        raise gdb.GdbError('usage: rcache [stats|clear|reset|on|off]')
+
+    stats = cache.stats()
+    print('page cache %s: %d/%d pages, generation %d' % (
+          'enabled' if cache.enabled else 'disabled',
+          stats['pages'], cache.max_pages, stats['generation']))
+    print('  hits %(hits)d misses %(misses)d bypassed %(bypassed)d '
+          'evictions %(evictions)d hit rate %(hit_rate).1f%%' % dict(stats,
+                                            hit_rate=stats['hit_rate'] * 100))
+    print('  unreadable %(unreadable)d pages, short circuited '
+          '%(short_circuited)d reads' % stats)
+
+    stats = memo.stats()
+    print('render memo %s: %d/%d entries' % (
+          'enabled' if memo.enabled else 'disabled',
+          stats['entries'], stats['size']))
+    print('  hits %(hits)d misses %(misses)d evictions %(evictions)d '
+          'hit rate %(hit_rate).1f%%' % dict(stats,
+                                            hit_rate=stats['hit_rate'] * 100))
+
+@command('rdiskcache')
+def disk_cache(arg, from_tty):
+    '''
+
+    Per build cache of enum/SField tables: rdiskcache [info|clear]
+
+    '''
+    diskcache = ripplegdb.diskcache
+    arg = arg.strip().lower() or 'info'
+    key = diskcache.build_key()
+
+    if arg == 'clear':
+        for k in diskcache.clear():
+            print('removed', diskcache.cache_path(k))
+    elif arg == 'info':
+        print('cache dir:', diskcache.CACHE_DIR)
+        print('current build:', key)
+        if key is not None:
+            print('tables:', ', '.join(diskcache.tables_for(key)) or '(none)')
+    else:
+        raise gdb.GdbError('usage: rdiskcache [info|clear]')
+
+@command('rstartup')
+def startup_report(arg, from_tty):
+    'Shows how long loading each ripplegdb module, and registering, took'
+    times = ripplegdb.load_times
+    total = sum(times.values())
+
+    for name, seconds in sorted(times.items(), key=lambda i: -i[1]):
+        print('%8.1fms %5.1f%%  %s' % (seconds * 1000,
+                                       100 * seconds / total if total else 0,
+                                       name))
+    print('%8.1fms         total (%s types)' % (
+          total * 1000, 'lazy' if ripplegdb.LAZY else 'eager'))
+    print('%d types resolved so far' % len(ripplegdb.types.resolved_types))
+
+@command('rmap')
+def page_map(arg, from_tty):
+    '''
+
+    Pages through a std::map or std::set: rmap EXPR [START [COUNT]]
+
+    Seeking to START reuses positions remembered from earlier pages (while
+    stopped), so it doesn't walk the tree from the beginning each time.
+
+    '''
+    argv = gdb.string_to_argv(arg)
+    if not argv:
+        raise gdb.GdbError('usage: rmap EXPR [START [COUNT]]')
+
+    start = int(argv[1]) if len(argv) > 1 else 0
+    count = int(argv[2]) if len(argv) > 2 else 20
+
+    val = gdb.parse_and_eval(argv[0])
+    if val.type.code == gdb.TYPE_CODE_REF:
+        val = val.referenced_value()
+
+    printer = gdb.default_visualizer(val)
+    if not hasattr(printer, 'children_from'):
+        raise gdb.GdbError('%s is not a std::map or std::set' % argv[0])
+
+    is_map = printer.display_hint() == 'map' if hasattr(
+                                printer, 'display_hint') else False
+    per_entry = 2 if is_map else 1
+    children = printer.children_from(start)
+
+    print(printer.to_string())
+    for i in range(start, start + count):
+        try:
+            entry = [next(children)[1] for _ in range(per_entry)]
+        except StopIteration:
+            break
+        print('[%d] %s' % (i, ' = '.join(map(str, entry))))
+
+def hashtable_of(expr):
+    val = gdb.parse_and_eval(expr)
+    if val.type.code == gdb.TYPE_CODE_REF:
+        val = val.referenced_value()
+    if val.type.code == gdb.TYPE_CODE_PTR:
+        val = val.dereference()
+    try:
+        return val['_M_h']
+    except gdb.error:
+        raise gdb.GdbError('%s is not a std::unordered_{map,set}' % expr)
+
+def key_bytes(expr, key_type):
+    key = gdb.parse_and_eval(expr)
+    if key.type.strip_typedefs() != key_type.strip_typedefs():
+        key = key.cast(key_type)
+    if key.address is not None:
+        return bytes(ripplegdb.values.read_value(key))
+    return int(key).to_bytes(key_type.sizeof, 'little', signed=int(key) < 0)
+
+@command('rhash')
+def hashtable_command(arg, from_tty):
+    '''
+
+    Inspects a std::unordered_{map,set} with raw reads:
+
+        rhash stats EXPR        bucket occupancy and chain length histogram
+        rhash find EXPR KEY     the entries whose key equals (the bytes of) KEY
+        rhash count EXPR        walks the nodes, and counts them
+
+    '''
+    argv = gdb.string_to_argv(arg)
+    if len(argv) < 2 or argv[0] not in ('stats', 'find', 'count'):
+        raise gdb.GdbError('usage: rhash stats|find|count EXPR [KEY]')
+
+    walker = ripplegdb.libcpp.HashtableWalker(hashtable_of(argv[1]))
+
+    if argv[0] == 'stats':
+        stats = walker.stats()
+        print('%(elements)d elements in %(buckets)d buckets '
+              '(load factor %(load_factor).2f)' % stats)
+        print('%(occupied)d occupied, %(empty)d empty, '
+              'chain length max %(max_chain)d mean %(mean_chain).2f' % stats)
+        for length, buckets in stats['histogram'].items():
+            print('  %6d buckets with %d' % (buckets, length))
+
+    elif argv[0] == 'count':
+        print(sum(1 for _ in walker.nodes()), 'nodes, _M_element_count',
+              len(walker))
+
+    else:
+        if len(argv) < 3:
+            raise gdb.GdbError('usage: rhash find EXPR KEY')
+        value_type = walker.layout.value_type.strip_typedefs()
+        key_type = (value_type.template_argument(0)
+                    if value_type.tag and value_type.tag.startswith('std::pair')
+                    else value_type)
+        for node in walker.find(key_bytes(' '.join(argv[2:]), key_type)):
+            print('0x%x: %s' % (node, walker.layout.value(node)))
+
+    if walker.truncated:
+        print('stopped after %d nodes, the list goes on past '
+              '_M_element_count (a cycle, or garbage)' %
+              (len(walker) + walker.slack))
+
+@command('rcore')
+def core_backend(arg, from_tty):
+    '''
+
+    Serve memory reads straight from an mmap of the core: rcore [on [PATH]|off]
+
+    Addresses the core doesn't hold (eg. the executable's text) still go
+    through gdb. Without arguments, shows the current state.
+
+    '''
+    argv = gdb.string_to_argv(arg)
+    values = ripplegdb.values
+
+    if argv and argv[0] == 'on':
+        path = argv[1] if len(argv) > 1 else corefile.current_core_path()
+        if path is None:
+            raise gdb.GdbError('not debugging a core file, give a PATH')
+        try:
+            values.set_core_backend(corefile.CoreFile(path))
+        except (OSError, corefile.ElfError) as e:
+            raise gdb.GdbError(str(e))
+    elif argv and argv[0] == 'off':
+        values.set_core_backend(None)
+    elif argv:
+        raise gdb.GdbError('usage: rcore [on [PATH]|off]')
+
+    core = values.core_backend
+    if core is None:
+        print('core backend disabled')
+    else:
+        print('core backend: %s, %d segments, %d hits, %d misses (via gdb)' % (
+              core.path, len(core.loads), core.hits, core.misses))
+
+@command('rfind')
+def find_bytes(arg, from_tty):
+    '''
+
+    Finds every address holding an account, currency or hash:
+
+        rfind r-ADDRESS|CURRENCY|HEX [LIMIT]
+
+    eg. `rfind USD`, or `rfind rHb9CJAWyB4rj91VRWn96DkukG4bwdtyTh`. Core files
+    are searched with a process pool, straight from the file.
+
+    '''
+    argv = gdb.string_to_argv(arg)
+    if not argv:
+        raise gdb.GdbError('usage: rfind r-ADDRESS|CURRENCY|HEX [LIMIT]')
+
+    memscan = ripplegdb.memscan
+    try:
+        needle = memscan.needle_bytes(argv[0])
+    except ValueError as e:
+        raise gdb.GdbError(str(e))
+    limit = int(argv[1]) if len(argv) > 1 else memscan.MAX_HITS
+
+    hits = memscan.search(needle, limit)
+    for address in hits:
+        print('0x%x  %s' % (address, memscan.annotate(address) or ''))
+    print('%d hits%s' % (len(hits), ' (limit reached)'
+                         if len(hits) >= limit else ''))
+
+@command('rtype')
+def dynamic_type(arg, from_tty):
+    '''
+
+    Shows the dynamic type of a polymorphic ripple object, via the vtable
+    index: rtype [-p] EXPR
+
+    With -p, also prints the object as that type.
+
+    '''
+    argv = gdb.string_to_argv(arg)
+    show = argv[:1] == ['-p']
+    if show:
+        argv = argv[1:]
+    if not argv:
+        raise gdb.GdbError('usage: rtype [-p] EXPR')
+
+    vtables = ripplegdb.vtables
+    val = gdb.parse_and_eval(' '.join(argv))
+    found = vtables.dynamic_type(val)
+    if found is None:
+        raise gdb.GdbError('no ripple vtable for %s (%d vtables indexed)' % (
+                           ' '.join(argv), len(vtables.vtable_index())))
+
+    (t, address) = found
+    print('(%s *) 0x%x' % (t, address))
+    if show:
+        print(vtables.downcast(val))
+
+@command('rheap')
+def heap_command(arg, from_tty):
+    '''
+
+    Counts live ripple objects by class: rheap census [LIMIT] [FILTER]
+
+    Scans the writable memory of the core (with a process pool) or live
+    process for ripple vptrs. See ripplegdb.heap for the caveats.
+
+    '''
+    argv = gdb.string_to_argv(arg)
+    if not argv or argv[0] != 'census':
+        raise gdb.GdbError('usage: rheap census [LIMIT] [FILTER]')
+
+    limit = int(argv[1]) if len(argv) > 1 else 50
+    pattern = argv[2] if len(argv) > 2 else ''
+
+    if not len(ripplegdb.vtables.vtable_index()):
+        raise gdb.GdbError('no ripple vtables found')
+
+    found = [c for c in ripplegdb.heap.census() if pattern in c.name]
+    print('%12s %10s %14s  %s' % ('count', 'sizeof', 'bytes', 'class'))
+    for c in found[:limit]:
+        print('%12d %10d %14d  %s' % (c.count, c.size, c.bytes, c.name))
+    print('%12d %10s %14d  total (%d classes)' % (
+          sum(c.count for c in found), '', sum(c.bytes for c in found),
+          len(found)))
+
+@command('rprofile')
+def profile_command(arg, from_tty):
+    '''
+
+    Samples the stacks of every thread of a live rippled, as folded stacks:
+
+        rprofile [-f HZ] [-d SECONDS] [-o FILE] [-a FUNC:EXPR[:ENUM]]...
+
+    Defaults to 20 HZ for 10 seconds, written to rprofile.folded. Each -a
+    labels frames of FUNC with EXPR (evaluated in that frame), optionally
+    shown symbolically as an ENUM (TxType, LedgerEntryType, TER ...).
+
+    '''
+    profiler = ripplegdb.profiler
+    argv = gdb.string_to_argv(arg)
+    options = dict(f='20', d='10', o='rprofile.folded')
+    annotations = []
+
+    while argv:
+        flag = argv.pop(0)
+        if flag not in ('-f', '-d', '-o', '-a') or not argv:
+            raise gdb.GdbError('usage: rprofile [-f HZ] [-d SECONDS] '
+                               '[-o FILE] [-a FUNC:EXPR[:ENUM]]...')
+        if flag == '-a':
+            try:
+                annotations.append(profiler.parse_annotation(argv.pop(0)))
+            except ValueError as e:
+                raise gdb.GdbError(str(e))
+        else:
+            options[flag[1]] = argv.pop(0)
+
+    result = profiler.profile(float(options['f']), float(options['d']),
+                              annotations)
+    lines = result.folded()
+    with open(options['o'], 'w') as fh:
+        fh.writelines(line + '\n' for line in lines)
+
+    print('%d samples of %d stacks, paused %.1fms per sample, wrote %s' % (
+          result.rounds, len(lines),
+          1000 * result.paused / result.rounds if result.rounds else 0,
+          options['o']))
+
+def thread_ranges(nums):
+    'eg. [1, 2, 3, 5] -> 1-3,5'
+    ranges = []
+    for n in sorted(nums):
+        if ranges and ranges[-1][1] == n - 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ','.join(str(a) if a == b else '%d-%d' % (a, b)
+                    for (a, b) in ranges)
+
+@command('rbt')
+def grouped_backtrace(arg, from_tty):
+    '''
+
+    Backtraces of all threads, each distinct stack shown once: rbt [-a] [DEPTH]
+
+    Only PCs are unwound (and symbolized once per PC), so this is quick even
+    with hundreds of threads. With -a, the first thread of each group also
+    gets a full `bt`, with its arguments formatted.
+
+    '''
+    stacks = ripplegdb.stacks
+    argv = gdb.string_to_argv(arg)
+    with_args = '-a' in argv
+    argv = [a for a in argv if a != '-a']
+    depth = int(argv[0]) if argv else stacks.MAX_DEPTH
+
+    groups = stacks.group_stacks(stacks.thread_stacks(depth))
+    selected = gdb.selected_thread()
+
+    for (pcs, threads) in groups:
+        print('%d thread%s: %s' % (len(threads), '' if len(threads) == 1
+                                   else 's',
+                                   thread_ranges(t.num for t in threads)))
+        if with_args:
+            threads[0].switch()
+            print(gdb.execute('bt %d' % depth, to_string=True), end='')
+        else:
+            for (i, pc) in enumerate(pcs):
+                print('  #%-3d %s' % (i, stacks.format_pc(pc)))
+        print()
+
+    if with_args and selected is not None and selected.is_valid():
+        selected.switch()
+    print('%d threads, %d distinct stacks' % (
+          sum(len(t) for (_, t) in groups), len(groups)))
+
+@command('rtrace')
+def trace_command(arg, from_tty):
+    '''
+
+    Non-stopping breakpoints, recording expressions on every hit:
+
+        rtrace [-o FILE] [-n RING] LOCATION EXPR...
+        rtrace list | show [ID [N]] | flush | delete [ID]
+
+    Records go to a ring buffer of RING (default 10000) entries, and when
+    FILE is given, are appended to it in batches (csv if it ends in .csv,
+    json lines otherwise).
+
+    '''
+    tracing = ripplegdb.tracing
+    argv = gdb.string_to_argv(arg)
+    usage = 'usage: rtrace [-o FILE] [-n RING] LOCATION EXPR...'
+
+    if not argv or argv[0] == 'list':
+        for bp in tracing.traces.values():
+            print(bp.describe())
+        if not tracing.traces:
+            print('no traces')
+
+    elif argv[0] == 'show':
+        if not tracing.traces:
+            raise gdb.GdbError('no traces')
+        number = int(argv[1]) if len(argv) > 1 else next(reversed(
+                                                          tracing.traces))
+        count = int(argv[2]) if len(argv) > 2 else 20
+        if number not in tracing.traces:
+            raise gdb.GdbError('no trace %d' % number)
+        ring = list(tracing.traces[number].ring)
+        for record in ring[-count:]:
+            print(json.dumps(record))
+
+    elif argv[0] == 'flush':
+        print('wrote %d records' % tracing.flush_all())
+
+    elif argv[0] == 'delete':
+        deleted = tracing.delete(int(argv[1]) if len(argv) > 1 else None)
+        print('deleted', ', '.join(map(str, deleted)) or 'nothing')
+
+    else:
+        options = {}
+        while argv and argv[0] in ('-o', '-n'):
+            if len(argv) < 2:
+                raise gdb.GdbError(usage)
+            options[argv[0]] = argv[1]
+            argv = argv[2:]
+        if len(argv) < 2:
+            raise gdb.GdbError(usage)
+
+        bp = tracing.trace(argv[0], argv[1:], options.get('-o'),
+                           int(options.get('-n', tracing.RING_SIZE)))
+        print('trace', bp.describe())
+
+@command('rstats')
+def printer_stats(arg, from_tty):
+    '''
+
+    Per printer call counts, timings, bytes read and gdb.Value subscripts:
+
+        rstats [show [N]|on|off|reset]
+
+    Instrumentation is off until `rstats on`, as it slows printing down.
+
+    '''
+    stats = ripplegdb.stats
+    argv = gdb.string_to_argv(arg) or ['show']
+
+    if argv[0] == 'on':
+        stats.enable()
+    elif argv[0] == 'off':
+        stats.disable()
+    elif argv[0] == 'reset':
+        stats.reset()
+    elif argv[0] != 'show':
+        raise gdb.GdbError('usage: rstats [show [N]|on|off|reset]')
+
+    limit = int(argv[1]) if argv[0] == 'show' and len(argv) > 1 else 25
+    print('printer stats %s' % ('enabled' if stats.enabled() else 'disabled'))
+    print('%8s %10s %10s %10s %10s %10s  %s' % (
+          'calls', 'total ms', 'mean us', 'p99 us', 'KB read', 'subscripts',
+          'printer'))
+    for s in stats.ranked()[:limit]:
+        if s.calls:
+            print('%8d %10.1f %10.1f %10.1f %10.1f %10d  %s' % (
+                  s.calls, s.seconds * 1000, s.mean() * 1e6, s.p99() * 1e6,
+                  s.bytes / 1024, s.subscripts, s.name))
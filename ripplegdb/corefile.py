@@ -0,0 +1,156 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import os
+import re
+import mmap
+import struct
+import bisect
+import collections
+
+##################################### DOCS #####################################
+"""
+
+A minimal ELF reader, enough to serve reads of a core file's memory straight
+out of an mmap of it, as zero-copy memoryview slices.
+
+Only 64 bit little endian files are supported. Addresses that aren't backed by
+the core itself, eg. the text of the executable and shared libraries, which are
+usually only in the files they're mapped from, are left to gdb.
+
+This doesn't need gdb, so it can be used from worker processes as well.
+
+"""
+################################### CONSTANTS ##################################
+
+ELF_MAGIC = b'\x7fELF'
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ET_CORE = 4
+
+PT_LOAD = 1
+PT_NOTE = 4
+
+PF_X, PF_W, PF_R = 1, 2, 4
+
+NT_GNU_BUILD_ID = 3
+
+ELF_HEADER = struct.Struct('<16sHHIQQQIHHHHHH')
+PROGRAM_HEADER = struct.Struct('<IIQQQQQQ')
+NOTE_HEADER = struct.Struct('<III')
+
+#################################### HELPERS ###################################
+
+Segment = collections.namedtuple('Segment', 'vaddr memsz offset filesz flags')
+
+def align(n, to):
+    return (n + to - 1) & ~(to - 1)
+
+class ElfError(Exception):
+    pass
+
+##################################### FILES ####################################
+
+class ElfFile:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fh:
+            self.map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        if len(self.map) < ELF_HEADER.size:
+            raise ElfError('%s: too small for an ELF file' % path)
+
+        (ident, self.e_type, _, _, _, phoff, _, _, _,
+         phentsize, phnum, _, _, _) = ELF_HEADER.unpack_from(self.map)
+
+        if ident[:4] != ELF_MAGIC:
+            raise ElfError('%s: not an ELF file' % path)
+        if ident[4] != ELFCLASS64 or ident[5] != ELFDATA2LSB:
+            raise ElfError('%s: only 64 bit little endian is supported' % path)
+
+        self.program_headers = [
+            PROGRAM_HEADER.unpack_from(self.map, phoff + i * phentsize)
+            for i in range(phnum)]
+
+    def segments(self, p_type=PT_LOAD):
+        return [Segment(vaddr, memsz, offset, filesz, flags)
+                for (t, flags, offset, vaddr, _, filesz, memsz, _)
+                in self.program_headers if t == p_type]
+
+    def notes(self):
+        'Yields (name, type, desc) from every PT_NOTE segment'
+        for seg in self.segments(PT_NOTE):
+            pos, end = seg.offset, seg.offset + seg.filesz
+            while pos + NOTE_HEADER.size <= end:
+                namesz, descsz, n_type = NOTE_HEADER.unpack_from(self.map, pos)
+                pos += NOTE_HEADER.size
+                name = bytes(self.view[pos:pos + namesz]).rstrip(b'\x00')
+                pos += align(namesz, 4)
+                desc = self.view[pos:pos + descsz]
+                pos += align(descsz, 4)
+                yield (name, n_type, desc)
+
+    def build_id(self):
+        for (name, n_type, desc) in self.notes():
+            if name == b'GNU' and n_type == NT_GNU_BUILD_ID:
+                return bytes(desc).hex()
+
+    def close(self):
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            # Slices are still out there, let them keep it alive
+            pass
+
+class CoreFile(ElfFile):
+    '''
+
+    Serves reads of a core's memory from its PT_LOAD segments.
+
+    `read` returns a memoryview into the mmap, or None when [address,
+    address + n) isn't wholly within the file backed part of one segment.
+
+    '''
+    def __init__(self, path):
+        super(CoreFile, self).__init__(path)
+        if self.e_type != ET_CORE:
+            raise ElfError('%s: not a core file' % path)
+
+        self.loads = sorted(self.segments(PT_LOAD))
+        self.starts = [s.vaddr for s in self.loads]
+        self.hits = self.misses = 0
+
+    def segment_for(self, address):
+        i = bisect.bisect_right(self.starts, address) - 1
+        if i >= 0:
+            seg = self.loads[i]
+            if address < seg.vaddr + seg.filesz:
+                return seg
+
+    def read(self, address, n):
+        seg = self.segment_for(address)
+        if seg is None or address + n > seg.vaddr + seg.filesz:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset = seg.offset + (address - seg.vaddr)
+        return self.view[offset:offset + n]
+
+    def regions(self, writable_only=False):
+        'The (address, file offset, size) of the memory the core holds'
+        return [(s.vaddr, s.offset, s.filesz) for s in self.loads
+                if s.filesz and (s.flags & PF_W or not writable_only)]
+
+################################## GDB TARGET ##################################
+
+CORE_FILE_RX = re.compile(r"core dump file:\s*`(.+?)'", re.MULTILINE)
+
+def current_core_path():
+    'The core file gdb is debugging, or None'
+    import gdb
+    info = gdb.execute('info target', to_string=True)
+    match = CORE_FILE_RX.search(info)
+    if match and os.path.isfile(match.group(1)):
+        return match.group(1)
@@ -0,0 +1,183 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import functools
+import struct
+
+# Gdb
+import gdb
+
+# Ours
+from ripplegdb.helpers import if_rippled
+from ripplegdb.values import read_memory, find_field, pointer_size, \
+                             SIGNED_FORMATS, UNSIGNED_FORMATS
+
+##################################### DOCS #####################################
+"""
+
+Decoding structs from their raw bytes.
+
+`val['mIssue']['currency']['pn']` is three gdb api calls, each resolving a
+field by name, every time. Instead, a Layout maps (dotted) field paths to
+offsets, resolved once per type and path, and `decode(val)` reads the object's
+bytes once, so fields can then be unpacked with struct.
+
+Field names vary between rippled versions, so every accessor takes a number of
+alternative paths, and uses the first that exists, eg.
+
+    d = decode(amount)
+    d.uint('mValue', 'mantissa_')
+
+"""
+################################### CONSTANTS ##################################
+
+REFERENCE_CODES = tuple(getattr(gdb, c) for c in ('TYPE_CODE_REF',
+                                                  'TYPE_CODE_RVALUE_REF')
+                        if hasattr(gdb, c))
+
+#################################### LAYOUTS ###################################
+
+# str(type) -> Layout, survives reloads but not a new rippled objfile
+try:
+    layouts
+except NameError:
+    layouts = {}
+
+def storage_size(t):
+    'sizeof, but references are stored as pointers'
+    if t.code in REFERENCE_CODES:
+        return pointer_size()
+    return t.sizeof
+
+def is_signed(t):
+    t = t.strip_typedefs()
+    try:
+        return t.is_signed
+    except (AttributeError, ValueError):
+        pass
+    if t.code == gdb.TYPE_CODE_ENUM:
+        return any(f.enumval < 0 for f in t.fields())
+    if t.code in (gdb.TYPE_CODE_INT, gdb.TYPE_CODE_CHAR):
+        return 'unsigned' not in str(t)
+    return False
+
+class Layout:
+    'Offsets of (dotted) field paths within a type, resolved on first use'
+
+    def __init__(self, t):
+        self.type = t.strip_typedefs()
+        self.size = self.type.sizeof
+        self.paths = {'': (0, self.type)}
+
+    def lookup(self, path):
+        'The (offset, type) of path, or None when there is no such field'
+        try:
+            return self.paths[path]
+        except KeyError:
+            pass
+
+        parent, _, name = path.rpartition('.')
+        found = self.lookup(parent)
+        if found is not None:
+            (offset, t) = found
+            field = find_field(t, name)
+            if field is not None:
+                found = (offset + field[0], field[1])
+            else:
+                found = None
+
+        self.paths[path] = found
+        return found
+
+    def resolve(self, *paths):
+        'The (offset, type) of the first of paths that exists'
+        for path in paths or ('', ):
+            found = self.lookup(path)
+            if found is not None:
+                return found
+        raise KeyError('%s has none of %s' % (self.type, ', '.join(paths)))
+
+    def has(self, *paths):
+        return any(self.lookup(p) is not None for p in paths)
+
+def layout_of(t):
+    key = str(t.strip_typedefs())
+    layout = layouts.get(key)
+    if layout is None:
+        layout = layouts[key] = Layout(t)
+    return layout
+
+try:              disconnect_layouts()
+except NameError: pass
+
+@if_rippled
+def clear_layouts(event=None):
+    layouts.clear()
+
+gdb.events.new_objfile.connect(clear_layouts)
+disconnect_layouts = functools.partial(gdb.events.new_objfile.disconnect,
+                                       clear_layouts)
+
+################################### DECODING ###################################
+
+class Decoded:
+    '''
+
+    An object's bytes (read once), and its type's Layout. Sub objects share
+    the same buffer.
+
+    '''
+    def __init__(self, layout, data, address=None):
+        self.layout = layout
+        self.data = data
+        self.address = address
+
+    def field(self, paths):
+        return self.layout.resolve(*paths)
+
+    def bytes(self, *paths):
+        (offset, t) = self.field(paths)
+        return self.data[offset:offset + storage_size(t)]
+
+    def int(self, *paths):
+        (offset, t) = self.field(paths)
+        size = storage_size(t)
+        fmt = (SIGNED_FORMATS if is_signed(t) else UNSIGNED_FORMATS)[size]
+        return struct.unpack_from('<' + fmt, self.data, offset)[0]
+
+    def uint(self, *paths):
+        (offset, t) = self.field(paths)
+        return struct.unpack_from('<' + UNSIGNED_FORMATS[storage_size(t)],
+                                  self.data, offset)[0]
+
+    pointer = uint
+
+    def bool(self, *paths):
+        return self.uint(*paths) != 0
+
+    def address_of(self, *paths):
+        return self.address + self.field(paths)[0]
+
+    def sub(self, *paths):
+        (offset, t) = self.field(paths)
+        return Decoded(layout_of(t), self.data[offset:offset + t.sizeof],
+                       None if self.address is None else self.address + offset)
+
+    def value(self, *paths):
+        'A gdb.Value for a field, for when we still need to use the gdb api'
+        (offset, t) = self.field(paths)
+        ptr = gdb.Value(self.address + offset).cast(t.pointer())
+        return ptr.dereference()
+
+def decode_at(address, t, data=None):
+    layout = layout_of(t)
+    if data is None:
+        data = read_memory(address, layout.size)
+    return Decoded(layout, data, address)
+
+def decode(val):
+    'Decodes val, or what a (typedef of a) pointer or reference refers to'
+    if val.type.strip_typedefs().code in REFERENCE_CODES + (
+                                            gdb.TYPE_CODE_PTR, ):
+        val = val.cast(val.type.strip_typedefs()).referenced_value()
+    return decode_at(int(val.address), val.type)
@@ -0,0 +1,119 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import os
+import json
+import hashlib
+
+from collections import OrderedDict
+
+# Ours
+from ripplegdb.helpers import rippled_objfile
+
+##################################### DOCS #####################################
+"""
+
+Tables we'd otherwise have to rebuild from DWARF, or by poking at the inferior,
+every time we're loaded (or reloaded), persisted as json.
+
+There's one file per rippled build, named after the objfile's build-id (or a
+hash of its path, mtime and size when it doesn't have one) so a rebuilt binary
+simply never sees the tables of the previous one.
+
+"""
+################################### CONSTANTS ##################################
+
+CACHE_DIR = os.environ.get('RIPPLEGDB_CACHE_DIR') or os.path.join(
+                os.environ.get('XDG_CACHE_HOME') or
+                os.path.expanduser('~/.cache'), 'ripplegdb')
+
+# Bump when the shape of anything stored changes
+FORMAT_VERSION = 1
+
+#################################### HELPERS ###################################
+
+# key -> {table name -> data}, survives module reloads
+try:
+    loaded_tables
+except NameError:
+    loaded_tables = {}
+
+def build_key(objfile=None):
+    objfile = objfile or rippled_objfile()
+    if objfile is None:
+        return None
+
+    build_id = getattr(objfile, 'build_id', None)
+    if build_id:
+        return 'build-%s-v%d' % (build_id, FORMAT_VERSION)
+
+    filename = os.path.realpath(objfile.filename)
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+
+    h = hashlib.sha1(('%s:%d:%d' % (filename, st.st_mtime_ns, st.st_size))
+                     .encode('utf8'))
+    return 'file-%s-v%d' % (h.hexdigest(), FORMAT_VERSION)
+
+def cache_path(key):
+    return os.path.join(CACHE_DIR, key + '.json')
+
+def tables_for(key):
+    tables = loaded_tables.get(key)
+    if tables is None:
+        try:
+            with open(cache_path(key)) as fh:
+                tables = json.load(fh, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            tables = OrderedDict()
+        loaded_tables[key] = tables
+    return tables
+
+def store(key, tables):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = cache_path(key) + '.%d.tmp' % os.getpid()
+        with open(tmp, 'w') as fh:
+            json.dump(tables, fh)
+        os.replace(tmp, cache_path(key))
+    except OSError as e:
+        print('warning: could not write %s: %s' % (cache_path(key), e))
+
+def cached(name, compute):
+    '''
+
+    Returns the table `name` for the current rippled build, calling
+    `compute()` and persisting the result if we don't have it yet.
+
+    The result goes through a json round trip either way, so callers see the
+    same types whether it was computed or loaded.
+
+    '''
+    key = build_key()
+    if key is None:
+        return compute()
+
+    tables = tables_for(key)
+    if name not in tables:
+        tables[name] = json.loads(json.dumps(compute()),
+                                  object_pairs_hook=OrderedDict)
+        store(key, tables)
+    return tables[name]
+
+def cached_keys():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    return [f[:-len('.json')] for f in sorted(os.listdir(CACHE_DIR))
+            if f.endswith('.json')]
+
+def clear(key=None):
+    keys = [key] if key else cached_keys()
+    for k in keys:
+        loaded_tables.pop(k, None)
+        try:
+            os.remove(cache_path(k))
+        except OSError:
+            pass
+    return keys
@@ -5,38 +5,82 @@ import functools
 import re
 
 from collections import OrderedDict
+from collections.abc import Mapping
 
 # Gdb
 import gdb
 
 # Us
+import ripplegdb
+from ripplegdb import diskcache
 from ripplegdb.libcpp import StdMapPrinter
 from ripplegdb.values import iterate_vector
 
 #################################### HELPERS ###################################
 
+def enum_fields(the_enum):
+    return [(f.name, f.enumval) for f in
+            sorted(the_enum.fields(), key=lambda f: f.enumval)]
+
+def cached_enum_fields(name):
+    return diskcache.cached('enum:' + name,
+                            lambda: enum_fields(gdb.lookup_type(name)))
+
 def enummap(the_enum, prefix=None, int_keys = True):
     if isinstance(the_enum, str):
-        the_enum = gdb.lookup_type(the_enum)
+        fields = cached_enum_fields(the_enum)
+    else:
+        fields = enum_fields(the_enum)
 
     mapping = OrderedDict()
-    for f in sorted(the_enum.fields(), key=lambda f: f.enumval):
-        symbolic = f.name
+    for (symbolic, enumval) in fields:
         if prefix is not None:
             symbolic = symbolic.replace(prefix, '')
 
         if int_keys:
-            mapping[f.enumval] = symbolic
-        mapping[symbolic] = f.enumval
+            mapping[enumval] = symbolic
+        mapping[symbolic] = enumval
     return mapping
 
 ripple_enum = functools.partial(enummap, prefix='ripple::')
 symbolic_enum = functools.partial(ripple_enum, int_keys=False)
 
-LET = ripple_enum('ripple::LedgerEntryType')
-TXT = ripple_enum('ripple::TxType')
-TER = ripple_enum('ripple::TER')
-STI = ripple_enum('ripple::SerializedTypeID')
+class LazyEnum(Mapping):
+    'A ripple_enum which is only built when first used'
+
+    def __init__(self, name):
+        self.name = name
+        self.mapping = None
+        self.gdb_type = None
+
+    def resolve(self):
+        if self.mapping is None:
+            self.mapping = ripple_enum(self.name)
+        return self.mapping
+
+    def __getitem__(self, k):
+        return self.resolve()[k]
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __len__(self):
+        return len(self.resolve())
+
+    def value(self, n):
+        'n as a gdb.Value of the enum, which gdb prints symbolically'
+        if self.gdb_type is None:
+            self.gdb_type = gdb.lookup_type(self.name)
+        return gdb.Value(n).cast(self.gdb_type)
+
+LET = LazyEnum('ripple::LedgerEntryType')
+TXT = LazyEnum('ripple::TxType')
+TER = LazyEnum('ripple::TER')
+STI = LazyEnum('ripple::SerializedTypeID')
+
+if not ripplegdb.LAZY:
+    for e in (LET, TXT, TER, STI):
+        e.resolve()
 
 ################################ RUN TIME ENUMS ################################
 '''
@@ -136,6 +180,10 @@ def get_formats(format_type, entry_type):
     return formats
 
 def all_enums():
+    'all_enums_uncached, persisted per rippled build'
+    return diskcache.cached('all_enums', all_enums_uncached)
+
+def all_enums_uncached():
     metas = get_SFields_meta_enum()
 
     d = OrderedDict()
@@ -0,0 +1,36 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import collections
+
+# Ours
+from ripplegdb import memscan
+from ripplegdb.vtables import vtable_index
+
+##################################### DOCS #####################################
+"""
+
+A census of the live ripple objects on the heap (or anywhere writable), by
+counting the words in memory which are the primary vptr of a ripple class.
+
+Counts are estimates: memory that was freed but not yet reused still holds
+the vptrs of the objects that were there. Bytes are count * sizeof(class),
+so don't include anything the objects own (eg. a vector's buffer).
+
+"""
+#################################### CENSUS ####################################
+
+ClassCount = collections.namedtuple('ClassCount', 'name count size bytes')
+
+def census(core_path=None):
+    'ClassCounts of every ripple class found, most bytes first'
+    index = vtable_index()
+    counts = memscan.count_words(index.by_vptr, core_path)
+
+    found = []
+    for (vptr, count) in counts.items():
+        t = index.type_of(vptr)
+        size = t.sizeof if t is not None else 0
+        found.append(ClassCount(index.by_vptr[vptr], count, size,
+                                count * size))
+    return sorted(found, key=lambda c: (-c.bytes, -c.count, c.name))
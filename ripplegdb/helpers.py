@@ -1,6 +1,7 @@
 #################################### IMPORTS ###################################
 # Std Libs
 import os
+import functools
 import importlib
 import base64
 import collections
@@ -25,6 +26,19 @@ def reload_module(m):
 def is_rippled(of):
     return os.path.basename(of.filename) == 'rippled'
 
+def if_rippled(handler):
+    '''
+
+    Wraps a new_objfile handler, so it only runs for rippled itself, not for
+    every shared library loaded. Called without an event it always runs.
+
+    '''
+    @functools.wraps(handler)
+    def wrapper(event=None):
+        if event is None or is_rippled(event.new_objfile):
+            return handler(event)
+    return wrapper
+
 def rippled_objfile():
     for of in gdb.objfiles():
         if is_rippled(of):
@@ -19,6 +19,11 @@ import gdb
 import itertools
 import re
 
+from ripplegdb.values import VectorView, field_offset, read_memory, \
+                             pointer_size, page_cache, UNSIGNED_FORMATS, \
+                             print_elements, find_field
+from ripplegdb.helpers import if_rippled
+
 # Try to use the new-style pretty-printing if available.
 _use_gdb_pp = True
 try:
@@ -227,9 +232,27 @@ class StdVectorPrinter:
         self.is_bool = val.type.template_argument(0).code  == gdb.TYPE_CODE_BOOL
 
     def children(self):
-        return self._iterator(self.val['_M_impl']['_M_start'],
-                              self.val['_M_impl']['_M_finish'],
+        impl = self.val['_M_impl']
+        lazy = self._iterator(impl['_M_start'], impl['_M_finish'],
                               self.is_bool)
+        if self.is_bool:
+            return lazy
+
+        # A corrupt vector (eg. in a core) gets the old per element reads
+        view = VectorView(self.val)
+        capacity = int(impl['_M_end_of_storage'] - view.start)
+        if not 0 <= view.count <= capacity:
+            return lazy
+
+        # One read for the elements gdb will print, rather than one per
+        # element, with any past `print elements` read lazily (gdb asks for
+        # one more, to know whether to print `...`)
+        count = view.count
+        view.limit(min(count, print_elements() or count))
+        lazy.item = view.start + len(view)
+        lazy.count = len(view)
+        return itertools.chain(
+            (('[%d]' % i, elt) for (i, elt) in enumerate(view)), lazy)
 
     def to_string(self):
         start = self.val['_M_impl']['_M_start']
@@ -391,6 +414,164 @@ def get_value_from_Rb_tree_node(node):
         pass
     raise ValueError("Unsupported implementation for %s" % str(node.type))
 
+class RbtreeNodeLayout:
+    "Where an _Rb_tree_node<_Val> keeps its value, resolved once per type"
+
+    layouts = {}
+
+    def __init__(self, node_type):
+        node_type = node_type.strip_typedefs()
+        member = node_type.fields()[1].name
+        if member not in ('_M_value_field', '_M_storage'):
+            raise ValueError("Unsupported implementation for %s" % node_type)
+        # Either the value itself (C++03) or an __aligned_buffer holding it
+        self.value_offset = field_offset(node_type, member)
+        self.value_type = node_type.template_argument(0).pointer()
+
+    @classmethod
+    def of(cls, node_type):
+        key = str(node_type)
+        layout = cls.layouts.get(key)
+        if layout is None:
+            layout = cls.layouts[key] = cls(node_type)
+        return layout
+
+    def value(self, node):
+        ptr = gdb.Value(node + self.value_offset)
+        return ptr.cast(self.value_type).dereference()
+
+class RbtreeWalker:
+    """In-order walk of an _Rb_tree, reading the node links as raw memory
+
+    Rather than a gdb.Value dereference per link followed, each node's
+    parent/left/right are read with one (page cached) read_memory. Every
+    CHECKPOINT_EVERY'th node address is remembered, so seek(n), and indexing,
+    only walk from the nearest checkpoint. Paging through a big map is then
+    O(page size) per page, not O(n)."""
+
+    CHECKPOINT_EVERY = 256
+
+    def __init__(self, rbtree):
+        impl = rbtree['_M_t']['_M_impl']
+        header = impl['_M_header']
+        base = header.type
+        self.size = int(impl['_M_node_count'])
+        # None for a tree not in memory (eg. returned by a call), whose nodes
+        # still are, so only the leftmost is read through gdb
+        self.header = (int(header.address) if header.address is not None
+                       else None)
+
+        self.parent_offset = field_offset(base, '_M_parent')
+        self.left_offset = field_offset(base, '_M_left')
+        self.right_offset = field_offset(base, '_M_right')
+        self.ptr_size = pointer_size()
+        self.ptr_format = UNSIGNED_FORMATS[self.ptr_size]
+        self.links_start = min(self.parent_offset, self.left_offset,
+                               self.right_offset)
+        self.links_size = (max(self.parent_offset, self.left_offset,
+                               self.right_offset) + self.ptr_size -
+                           self.links_start)
+        self.checkpoints = []
+        if self.size and self.header is None:
+            self.checkpoints.append(int(header['_M_left']))
+        elif self.size:
+            self.checkpoints.append(self.read_pointer(self.header,
+                                                      self.left_offset))
+
+    def read_pointer(self, node, offset):
+        return read_memory(node + offset, self.ptr_size).cast(
+                                                        self.ptr_format)[0]
+
+    def links(self, node):
+        "(parent, left, right) of node, in one read"
+        words = read_memory(node + self.links_start, self.links_size)
+        def at(offset):
+            offset -= self.links_start
+            return int.from_bytes(words[offset:offset + self.ptr_size],
+                                  'little')
+        return (at(self.parent_offset), at(self.left_offset),
+                at(self.right_offset))
+
+    def successor(self, node):
+        (parent, left, right) = self.links(node)
+        if right:
+            node = right
+            while True:
+                left = self.links(node)[1]
+                if not left:
+                    return node
+                node = left
+        while node == self.links(parent)[2]:
+            node = parent
+            parent = self.links(parent)[0]
+        if self.links(node)[2] != parent:
+            node = parent
+        return node
+
+    def __len__(self):
+        return self.size
+
+    def iter_from(self, n=0):
+        "Yields the addresses of the nodes from index n on"
+        if n >= self.size:
+            return
+        k = self.CHECKPOINT_EVERY
+        c = min(n // k, len(self.checkpoints) - 1)
+        i, node = c * k, self.checkpoints[c]
+
+        while True:
+            if i >= n:
+                yield node
+            i += 1
+            if i == self.size:
+                return
+            node = self.successor(node)
+            if i % k == 0 and i // k == len(self.checkpoints):
+                self.checkpoints.append(node)
+
+    def seek(self, n):
+        "The address of the n'th node"
+        if not 0 <= n < self.size:
+            raise IndexError(n)
+        return next(self.iter_from(n))
+
+    __getitem__ = seek
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+try:              gdb.events.new_objfile.disconnect(clear_rbtree_layouts)
+except NameError: pass
+
+@if_rippled
+def clear_rbtree_layouts(event=None):
+    RbtreeNodeLayout.layouts.clear()
+
+gdb.events.new_objfile.connect(clear_rbtree_layouts)
+
+# (header address, page cache generation) -> RbtreeWalker, so paging through
+# the same map while stopped reuses its checkpoints.
+rbtree_walkers = {}
+
+def rbtree_walker(rbtree):
+    header = rbtree['_M_t']['_M_impl']['_M_header'].address
+    if header is None:
+        # Not in memory (eg. a value returned by a call), so nothing to key on
+        return RbtreeWalker(rbtree)
+    key = (int(header), page_cache.generation)
+    walker = rbtree_walkers.get(key)
+    if walker is None:
+        if len(rbtree_walkers) > 64 or any(
+                g != page_cache.generation for (_, g) in rbtree_walkers):
+            rbtree_walkers.clear()
+        walker = rbtree_walkers[key] = RbtreeWalker(rbtree)
+    return walker
+
+def rbtree_node_layout(val):
+    rep_type = find_type(val.type, '_Rep_type')
+    node = find_type(rep_type, '_Link_type')
+    return RbtreeNodeLayout.of(node.strip_typedefs().target())
+
 # This is a pretty printer for std::_Rb_tree_iterator (which is
 # std::map::iterator), and has nothing to do with the RbtreeIterator
 # class above.
@@ -421,12 +602,12 @@ class StdDebugIteratorPrinter:
 class StdMapPrinter:
     "Print a std::map or std::multimap"
 
-    # Turn an RbtreeIterator into a pretty-print iterator.
+    # Turn an RbtreeWalker into a pretty-print iterator.
     class _iter:
-        def __init__(self, rbiter, type):
-            self.rbiter = rbiter
-            self.count = 0
-            self.type = type
+        def __init__(self, nodes, layout, count=0):
+            self.rbiter = nodes
+            self.count = count
+            self.layout = layout
 
         def __iter__(self):
             return self
@@ -434,8 +615,7 @@ class StdMapPrinter:
         def __next__(self):
             if self.count % 2 == 0:
                 n = next(self.rbiter)
-                n = n.cast(self.type).dereference()
-                n = get_value_from_Rb_tree_node(n)
+                n = self.layout.value(n)
                 self.pair = n
                 item = n['first']
             else:
@@ -453,10 +633,13 @@ class StdMapPrinter:
                                         len (RbtreeIterator (self.val)))
 
     def children (self):
-        rep_type = find_type(self.val.type, '_Rep_type')
-        node = find_type(rep_type, '_Link_type')
-        node = node.strip_typedefs()
-        return self._iter (RbtreeIterator (self.val), node)
+        return self.children_from(0)
+
+    def children_from (self, start):
+        "Children of the entries from index start on"
+        walker = rbtree_walker(self.val)
+        return self._iter (walker.iter_from(start),
+                           rbtree_node_layout(self.val), 2 * start)
 
     def display_hint (self):
         return 'map'
@@ -464,20 +647,19 @@ class StdMapPrinter:
 class StdSetPrinter:
     "Print a std::set or std::multiset"
 
-    # Turn an RbtreeIterator into a pretty-print iterator.
+    # Turn an RbtreeWalker into a pretty-print iterator.
     class _iter:
-        def __init__(self, rbiter, type):
-            self.rbiter = rbiter
-            self.count = 0
-            self.type = type
+        def __init__(self, nodes, layout, count=0):
+            self.rbiter = nodes
+            self.count = count
+            self.layout = layout
 
         def __iter__(self):
             return self
 
         def __next__(self):
             item = next(self.rbiter)
-            item = item.cast(self.type).dereference()
-            item = get_value_from_Rb_tree_node(item)
+            item = self.layout.value(item)
             # FIXME: this is weird ... what to do?
             # Maybe a 'set' display hint?
             result = ('[%d]' % self.count, item)
@@ -493,10 +675,13 @@ class StdSetPrinter:
                                         len (RbtreeIterator (self.val)))
 
     def children (self):
-        rep_type = find_type(self.val.type, '_Rep_type')
-        node = find_type(rep_type, '_Link_type')
-        node = node.strip_typedefs()
-        return self._iter (RbtreeIterator (self.val), node)
+        return self.children_from(0)
+
+    def children_from (self, start):
+        "Children of the entries from index start on"
+        walker = rbtree_walker(self.val)
+        return self._iter (walker.iter_from(start),
+                           rbtree_node_layout(self.val), start)
 
 class StdBitsetPrinter:
     "Print a std::bitset"
@@ -686,6 +871,138 @@ class StdHashtableIterator:
         valptr = valptr.cast(elt.type.template_argument(0).pointer())
         return valptr.dereference()
 
+class HashtableLayout:
+    "Where a std::_Hashtable's nodes keep their links and values"
+
+    layouts = {}
+
+    def __init__(self, hashtable_type):
+        node_type = find_type(hashtable_type, '__node_type').strip_typedefs()
+        nxt = find_field(node_type, '_M_nxt')
+        storage = find_field(node_type, '_M_storage')
+        if nxt is None or storage is None:
+            raise ValueError("Unsupported implementation for %s" % node_type)
+        self.nxt_offset = nxt[0]
+        self.value_offset = storage[0]
+        self.value_type = node_type.template_argument(0)
+        self.value_pointer = self.value_type.pointer()
+
+    @classmethod
+    def of(cls, hashtable_type):
+        key = str(hashtable_type.strip_typedefs())
+        layout = cls.layouts.get(key)
+        if layout is None:
+            layout = cls.layouts[key] = cls(hashtable_type)
+        return layout
+
+    def value(self, node):
+        ptr = gdb.Value(node + self.value_offset)
+        return ptr.cast(self.value_pointer).dereference()
+
+class HashtableWalker:
+    """Walks a (C++11) std::_Hashtable by following _M_nxt with raw reads
+
+    The node layout is resolved once per hashtable type, after which each
+    step is a single pointer sized (page cached) read_memory, and gdb.Values
+    are only made for the nodes asked for.
+
+    A list still going past _M_element_count (plus slack) is a cycle, or
+    garbage in a crashed process, so the walk stops there and sets truncated."""
+
+    slack = 16
+
+    def __init__(self, hashtable):
+        self.layout = HashtableLayout.of(hashtable.type)
+        self.ptr_size = pointer_size()
+        self.ptr_format = UNSIGNED_FORMATS[self.ptr_size]
+
+        self.before_begin = int(hashtable['_M_before_begin'].address)
+        self.buckets = int(hashtable['_M_buckets'])
+        self.bucket_count = int(hashtable['_M_bucket_count'])
+        self.size = int(hashtable['_M_element_count'])
+        self.truncated = False
+
+    def read_pointer(self, address):
+        return read_memory(address, self.ptr_size).cast(self.ptr_format)[0]
+
+    def __len__(self):
+        return self.size
+
+    def nodes(self):
+        "Yields the address of every node, in iteration order"
+        nxt = self.layout.nxt_offset
+        node = self.read_pointer(self.before_begin + nxt)
+        remaining = self.size + self.slack
+        while node:
+            if not remaining:
+                self.truncated = True
+                return
+            remaining -= 1
+            yield node
+            node = self.read_pointer(node + nxt)
+
+    def values(self):
+        return map(self.layout.value, self.nodes())
+
+    def find(self, key):
+        """Yields the nodes whose key (the first len(key) bytes of the value)
+        equals the raw bytes key"""
+        offset, n = self.layout.value_offset, len(key)
+        for node in self.nodes():
+            if read_memory(node + offset, n) == key:
+                yield node
+
+    def chain_lengths(self):
+        """bucket -> number of nodes, for the occupied buckets
+
+        Each bucket points at the node *before* its first one, so walking the
+        single list of nodes, the bucket changes whenever the previous node
+        is one of those."""
+        buckets = read_memory(self.buckets, self.bucket_count * self.ptr_size)
+        starts = dict((before, i) for (i, before) in
+                      enumerate(buckets.cast(self.ptr_format)) if before)
+
+        lengths = {}
+        bucket, prev = None, self.before_begin
+        for node in self.nodes():
+            bucket = starts.get(prev, bucket)
+            lengths[bucket] = lengths.get(bucket, 0) + 1
+            prev = node
+        return lengths
+
+    def stats(self):
+        lengths = self.chain_lengths()
+        histogram = {}
+        for n in lengths.values():
+            histogram[n] = histogram.get(n, 0) + 1
+
+        occupied = len(lengths)
+        return dict(elements=self.size,
+                    truncated=self.truncated,
+                    buckets=self.bucket_count,
+                    load_factor=self.size / max(self.bucket_count, 1),
+                    occupied=occupied,
+                    empty=self.bucket_count - occupied,
+                    max_chain=max(lengths.values()) if lengths else 0,
+                    mean_chain=(sum(lengths.values()) / occupied
+                                if occupied else 0.0),
+                    histogram=dict(sorted(histogram.items())))
+
+def hashtable_values(hashtable):
+    try:
+        return HashtableWalker(hashtable).values()
+    except (ValueError, gdb.error):
+        return StdHashtableIterator(hashtable)
+
+try:              gdb.events.new_objfile.disconnect(clear_hashtable_layouts)
+except NameError: pass
+
+@if_rippled
+def clear_hashtable_layouts(event=None):
+    HashtableLayout.layouts.clear()
+
+gdb.events.new_objfile.connect(clear_hashtable_layouts)
+
 class Tr1UnorderedSetPrinter:
     "Print a tr1::unordered_set"
 
@@ -709,7 +1026,7 @@ class Tr1UnorderedSetPrinter:
         counter = map (self.format_count, itertools.count())
         if self.typename.startswith('std::tr1'):
             return zip (counter, Tr1HashtableIterator (self.hashtable()))
-        return zip (counter, StdHashtableIterator (self.hashtable()))
+        return zip (counter, hashtable_values (self.hashtable()))
 
 class Tr1UnorderedMapPrinter:
     "Print a tr1::unordered_map"
@@ -747,7 +1064,7 @@ class Tr1UnorderedMapPrinter:
             data = self.flatten (map (self.format_one, Tr1HashtableIterator (self.hashtable())))
             # Zip the two iterators together.
             return zip (counter, data)
-        data = self.flatten (map (self.format_one, StdHashtableIterator (self.hashtable())))
+        data = self.flatten (map (self.format_one, hashtable_values (self.hashtable())))
         # Zip the two iterators together.
         return zip (counter, data)
         
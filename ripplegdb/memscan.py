@@ -0,0 +1,300 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import os
+import re
+import mmap
+import collections
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+# Gdb
+import gdb
+
+# Ours
+from ripplegdb import corefile
+from ripplegdb.base58 import base58_check_decode
+from ripplegdb.values import direct_read
+
+##################################### DOCS #####################################
+"""
+
+Searching the whole of the inferior's memory for a byte string.
+
+gdb's `find` reads memory through the target, a little at a time, which on a
+core of many GB takes minutes. Core files are instead mmapped, and their
+PT_LOAD segments split into chunks, searched with `mmap.find` (ie. memchr and
+friends, no copies) across a (forked) process pool.
+
+Live processes are read in large chunks through gdb, in process.
+
+"""
+################################### CONSTANTS ##################################
+
+CHUNK_SIZE = 64 << 20
+LIVE_CHUNK_SIZE = 16 << 20
+
+# Stop collecting hits after this many, a needle of zeros would match forever
+MAX_HITS = 10000
+
+HEX_256_RX = re.compile(r'^(0x)?[0-9a-fA-F]{64}$')
+HEX_160_RX = re.compile(r'^(0x)?[0-9a-fA-F]{40}$')
+CURRENCY_RX = re.compile(r'^[A-Za-z0-9?!@#$%^&*<>(){}\[\]|]{3}$')
+
+MAPPING_RX = re.compile(r'^\s*(0x[0-9a-f]+)\s+(0x[0-9a-f]+)\s(.*)$',
+                        re.MULTILINE)
+PERMS_RX = re.compile(r'(?<!\S)[r-][w-][x-][ps](?!\S)')
+
+WORD_SIZE = 8
+
+#################################### NEEDLES ###################################
+
+def currency_bytes(code):
+    'The 160 bit currency for a 3 letter ISO style code, as in uint160_repr'
+    if code == 'XRP':
+        return bytes(20)
+    return bytes(12) + code.encode('ascii') + bytes(5)
+
+def needle_bytes(text):
+    '''
+
+    The bytes for an r-address (AccountID), 3 letter currency code, or a 160
+    or 256 bit hex hash (eg. a ledger index or transaction id).
+
+    '''
+    text = text.strip()
+    if HEX_256_RX.match(text) or HEX_160_RX.match(text):
+        return bytes.fromhex(text[2:] if text.startswith('0x') else text)
+    if CURRENCY_RX.match(text):
+        return currency_bytes(text)
+    if text.startswith('r'):
+        try:
+            return base58_check_decode(text)
+        except BaseException:
+            # Bad checksum/version, which base58 raises as BaseException
+            pass
+    raise ValueError('%s is not an r-address, currency or hash' % text)
+
+################################### SCANNING ###################################
+
+def chunks(regions, needle_size, chunk_size=CHUNK_SIZE):
+    '''
+
+    Splits (address, file offset, size) regions into chunks of the same
+    shape, overlapping by needle_size - 1 so no match straddling a boundary
+    is missed (or found twice).
+
+    '''
+    overlap = needle_size - 1
+    for (address, offset, size) in regions:
+        pos = 0
+        while pos < size:
+            n = min(chunk_size + overlap, size - pos)
+            yield (address + pos, offset + pos, n)
+            pos += chunk_size
+
+def find_all(buf, needle, start, end, limit):
+    found = []
+    pos = buf.find(needle, start, end)
+    while pos != -1 and len(found) < limit:
+        found.append(pos)
+        pos = buf.find(needle, pos + 1, end)
+    return found
+
+def scan_core_chunk(path, needle, chunk, limit=MAX_HITS):
+    'Runs in a worker: the addresses of needle within a chunk of the core'
+    (address, offset, size) = chunk
+    with open(path, 'rb') as fh:
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return [address + (pos - offset) for pos in
+                find_all(mm, needle, offset, offset + size, limit)]
+    finally:
+        mm.close()
+
+def workers():
+    return os.cpu_count() or 1
+
+def scan_core(core, needle, limit=MAX_HITS, processes=None):
+    jobs = list(chunks(core.regions(), len(needle)))
+    processes = min(processes or workers(), len(jobs))
+    if processes <= 1:
+        results = (scan_core_chunk(core.path, needle, c, limit) for c in jobs)
+        return collect(results, limit)
+
+    # Forked, so the workers don't need to import anything (including gdb)
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(processes, mp_context=context) as pool:
+        futures = [pool.submit(scan_core_chunk, core.path, needle, c, limit)
+                   for c in jobs]
+        try:
+            return collect((f.result() for f in futures), limit)
+        finally:
+            # Past the limit, leaving only waits for the chunks in progress
+            for future in futures:
+                future.cancel()
+
+def collect(results, limit):
+    hits = []
+    for found in results:
+        hits.extend(found)
+        if len(hits) >= limit:
+            break
+    return sorted(hits)[:limit]
+
+def live_regions(writable_only=False):
+    '''
+
+    The (address, size) of every mapping of the (live) inferior. Older gdbs
+    don't show permissions, in which case writable_only keeps everything.
+
+    '''
+    info = gdb.execute('info proc mappings', to_string=True)
+    regions = []
+    for (start, end, rest) in MAPPING_RX.findall(info):
+        perms = PERMS_RX.search(rest)
+        if writable_only and perms and perms.group(0)[1] != 'w':
+            continue
+        regions.append((int(start, 16), int(end, 16) - int(start, 16)))
+    return regions
+
+def scan_live(needle, limit=MAX_HITS):
+    inferior = gdb.selected_inferior()
+    hits = []
+    regions = [(address, address, size) for (address, size) in live_regions()]
+    for (address, _, size) in chunks(regions, len(needle), LIVE_CHUNK_SIZE):
+        try:
+            data = direct_read(inferior, address, size)
+        except gdb.MemoryError:
+            continue
+        found = find_all(bytes(data), needle, 0, size, limit - len(hits))
+        hits.extend(address + pos for pos in found)
+        if len(hits) >= limit:
+            break
+    return hits
+
+def search(needle, limit=MAX_HITS, core_path=None):
+    'Every address at which needle occurs, using the core when we have one'
+    core_path = core_path or corefile.current_core_path()
+    if core_path is None:
+        return scan_live(needle, limit)
+
+    core = corefile.CoreFile(core_path)
+    try:
+        return scan_core(core, needle, limit)
+    finally:
+        core.close()
+
+################################# WORD COUNTING ################################
+'''
+
+Counting the aligned 8 byte words, across memory, which are one of a set of
+values (eg. vptrs). Each chunk is cast to a memoryview of words, which are
+filtered by set membership and counted without a python level loop, ie. the
+per word work all happens in C.
+
+'''
+
+def count_words_in(buf, address, start, end, wanted, counts):
+    '''
+
+    Adds to counts the wanted words in buf[start:end], which is mapped at
+    address. Only aligned words wholly within [start, end) are considered.
+
+    '''
+    lo = start + (-address % WORD_SIZE)
+    hi = lo + (end - lo) // WORD_SIZE * WORD_SIZE
+    if hi <= lo:
+        return counts
+    view = memoryview(buf)[lo:hi]
+    try:
+        counts.update(filter(wanted.__contains__, view.cast('Q')))
+    finally:
+        view.release()
+    return counts
+
+def count_core_chunk(path, chunk, wanted):
+    'Runs in a worker: {word: count} of wanted, within a chunk of the core'
+    (address, offset, size) = chunk
+    with open(path, 'rb') as fh:
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return count_words_in(mm, address, offset, offset + size, wanted,
+                              collections.Counter())
+    finally:
+        mm.close()
+
+def count_core_words(core, wanted, processes=None):
+    jobs = list(chunks(core.regions(writable_only=True), WORD_SIZE))
+    processes = min(processes or workers(), len(jobs))
+
+    if processes <= 1:
+        results = (count_core_chunk(core.path, c, wanted) for c in jobs)
+        return merge_counts(results)
+
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(processes, mp_context=context) as pool:
+        n = len(jobs)
+        return merge_counts(pool.map(count_core_chunk, [core.path] * n, jobs,
+                                     [wanted] * n))
+
+def count_live_words(wanted):
+    inferior = gdb.selected_inferior()
+    counts = collections.Counter()
+    regions = [(a, a, size) for (a, size) in live_regions(writable_only=True)]
+    for (address, _, size) in chunks(regions, WORD_SIZE, LIVE_CHUNK_SIZE):
+        try:
+            data = bytes(direct_read(inferior, address, size))
+        except gdb.MemoryError:
+            continue
+        count_words_in(data, address, 0, size, wanted, counts)
+    return dict(counts)
+
+def merge_counts(results):
+    counts = {}
+    for found in results:
+        for (word, n) in found.items():
+            counts[word] = counts.get(word, 0) + n
+    return counts
+
+def count_words(wanted, core_path=None):
+    '{word: occurrences} of the wanted words, over writable memory'
+    # Zero would count every word of zeroed memory
+    wanted = frozenset(wanted) - {0}
+    if not wanted:
+        return {}
+
+    core_path = core_path or corefile.current_core_path()
+    if core_path is None:
+        return count_live_words(wanted)
+
+    core = corefile.CoreFile(core_path)
+    try:
+        return count_core_words(core, wanted)
+    finally:
+        core.close()
+
+################################## ANNOTATION ##################################
+
+# Functions of (address) -> str or None, describing what owns an address. The
+# first to return something wins. Others (eg. heap object lookups) may add to
+# these.
+try:
+    annotators
+except NameError:
+    annotators = []
+
+def symbol_annotator(address):
+    info = gdb.execute('info symbol 0x%x' % address, to_string=True).strip()
+    if info and not info.startswith('No symbol matches'):
+        return info
+
+def annotate(address):
+    for annotator in annotators + [symbol_annotator]:
+        try:
+            found = annotator(address)
+        except gdb.error:
+            found = None
+        if found:
+            return found
@@ -5,7 +5,6 @@ import functools
 import os
 import re
 import json
-import struct
 import collections
 
 from decimal import Decimal
@@ -15,12 +14,18 @@ import gdb
 import gdb.types
 
 # Ripplegdb
-
-from ripplegdb.base58 import base58_check_encode
-from ripplegdb.helpers import Proxy, hex_encode, moneyfmt
-from ripplegdb.types import STI_TO_TYPE_MAPPING, SerializedType
-from ripplegdb.values import read_value, iterate_vector, read_blob
-from ripplegdb.enums import LET, TER, TXT
+import ripplegdb
+from ripplegdb.base58 import encode_account_id
+from ripplegdb.helpers import hex_encode, moneyfmt, if_rippled
+from ripplegdb.types import STI_TO_TYPE_MAPPING, SerializedType, SField
+from ripplegdb.values import read_value, read_blob, \
+                             VectorView, field_offset, field_spec, \
+                             read_pointer, read_uint, pointer_size, \
+                             unreadable, InvalidSize
+from ripplegdb.enums import LET, TER, TXT, STI
+from ripplegdb.decoders import decode, decode_at
+from ripplegdb.vtables import vtable_index
+from ripplegdb import budget
 
 ################################### REGISTRY ###################################
 
@@ -47,37 +52,45 @@ def get(k, default=None):
 
 ################################################################################
 
-@register(helper_name='Q')
-def pQuality(val):
-    (rate, ) = struct.unpack_from("Q", read_value(val))
+def quality_repr(rate):
     mantissa = rate & ~ (0xFF << (64 - 8))
     exponent = (rate >> (64 - 8)) - 100
     quality  = float("%se%s" % (mantissa, exponent))
     return str(quality)
 
-@register
-def pUint160(val, currency=False, read_value=read_value):
-    d = read_value(val['pn'])
-    non_empties = tuple(i for i in range(len(d)) if d[i] != b'\x00'
+@register(helper_name='Q')
+def pQuality(val):
+    return quality_repr(decode(val).uint())
+
+def uint160_repr(d, currency=False):
+    d = bytes(d)
+    non_empties = tuple(i for i in range(len(d)) if d[i] != 0
                         and (i == 19 or 12 <= i <= 14))
 
     if non_empties == ():
         return 'XRP' if currency else '0'
-    elif non_empties == (19,) and d[19] == b'\x01':
+    elif non_empties == (19,) and d[19] == 1:
         return '1'
     elif non_empties == (12, 13, 14):
         return str(d[12:12+3], 'ascii')
     elif currency:
-        return hex_encode(bytes(d))
+        return hex_encode(d)
     else:
-        return base58_check_encode(bytes(d))
+        return encode_account_id(d)
+
+@register
+def pUint160(val, currency=False):
+    return uint160_repr(decode(val).bytes('pn'), currency)
 
 pCurrency = functools.partial(pUint160, currency=True)
 pAccountID = functools.partial(pUint160, currency=False)
 
+def blob_bytes(val):
+    'read_blob, no bigger than the element budget'
+    return read_blob(val, budget.limits['elements'])
+
 def pSTAccount(val):
-    pn = read_blob(val['value'])
-    return pAccountID({'pn': pn},read_value=lambda v: v)
+    return uint160_repr(blob_bytes(val['value']))
 
 def pUintAll(val, read_value=read_value):
     return hex_encode((read_value(val['pn'])))
@@ -85,6 +98,27 @@ def pUintAll(val, read_value=read_value):
 def pstd_string(val):
     return val['_M_dataplus']['_M_p'].string()
 
+# Alternative paths for each STAmount field, across rippled versions
+STAMOUNT_FIELDS = dict(
+    native   = ('mIsNative', ),
+    negative = ('mIsNegative', ),
+    mantissa = ('mValue', 'mantissa', 'mantissa_'),
+    exponent = ('mOffset', 'exponent', 'exponent_'),
+    currency = ('mIssue.currency.pn', 'mCurrency.pn'),
+    issuer   = ('mIssue.account.pn', 'mIssuer.pn'),
+)
+
+def amount_to_decimal(d):
+    fields = STAMOUNT_FIELDS
+
+    is_native   = d.bool(*fields['native'])
+    is_negative = d.bool(*fields['negative'])
+    mantissa    = d.uint(*fields['mantissa'])
+    exponent    = -6 if is_native else d.int(*fields['exponent'])
+    sign        = '-' if is_negative else '+'
+
+    return Decimal(''.join(map(str, [sign, mantissa, 'e', exponent])))
+
 def STAmount_to_decimal(val):
     '''
 
@@ -92,28 +126,19 @@ def STAmount_to_decimal(val):
     calculations, that way we don't lose any accuracy.
 
     '''
-
-    is_native   = val['mIsNative']
-    is_negative = val['mIsNegative']
-    mantissa    = val['mValue']
-    exponent    = -6 if is_native else int(val['mOffset'])
-    sign        = '-' if is_negative else '+'
-
-    v = Decimal(''.join(map(str, [sign, mantissa, 'e', exponent])))
-
-    return v
+    return amount_to_decimal(decode(val))
 
 def format_decimal(d):
     return str(d)
     return "%32f" % d
     return moneyfmt(d, places=32)
 
-def pSTAmount(val):
-    v = format_decimal(STAmount_to_decimal(val))
+def amount_repr(d):
+    v = format_decimal(amount_to_decimal(d))
 
-    field    = pstd_string(val['fName']['rawJsonName'])
-    currency = pCurrency(val['mIssue']['currency'])
-    issuer   = pAccountID(val['mIssue']['account'])
+    field    = sfield_json_name(d.pointer('fName'))
+    currency = uint160_repr(d.bytes(*STAMOUNT_FIELDS['currency']), True)
+    issuer   = uint160_repr(d.bytes(*STAMOUNT_FIELDS['issuer']))
 
     if currency == 'XRP':
         ret = "%s/XRP%s" % (v, '' if issuer == '0' else issuer)
@@ -124,7 +149,24 @@ def pSTAmount(val):
 
     return ret
 
+def pSTAmount(val):
+    return amount_repr(decode(val))
+
+def ter_repr(code):
+    name = TER.get(code)
+    return str(code) if name is None else 'ripple::%s' % name
+
+PATH_STATE_AMOUNTS = ('saInReq', 'saInAct', 'saInPass',
+                      'saOutReq', 'saOutAct', 'saOutPass')
+
 def pPathState(val):
+    d = decode(val)
+    fields = dict((k, amount_repr(d.sub(k))) for k in PATH_STATE_AMOUNTS)
+    fields.update(mIndex    = d.int('mIndex'),
+                  terStatus = ter_repr(d.int('terStatus')),
+                  uQuality  = quality_repr(d.uint('uQuality')),
+                  nodes_    = NodeList(d.value('nodes_')))
+
     return """\n
 PathState %(mIndex)s:
     ter:%(terStatus)s: Q:%(uQuality)s
@@ -138,10 +180,27 @@ PathState %(mIndex)s:
         pass:%(saOutPass)s
     nodes:
         %(nodes_)s
-""" % Proxy(val, uQuality=pQuality, nodes_= NodeList)
+""" % fields
 
 def NodeList(val):
-    return ''.join(pNode(n, i) for i,n in enumerate(iterate_vector(val)))
+    # The whole vector is read at once, and each Node decoded from its slice
+    nodes = VectorView(val)
+    count = len(nodes)
+    tracker = budget.Tracker(str(val.type))
+    nodes.limit(tracker.allowed(count))
+
+    reprs = []
+    try:
+        for i in range(len(nodes)):
+            tracker.tick()
+            reprs.append(node_repr(decode_at(nodes.address + i * nodes.itemsize,
+                                             nodes.type, nodes.item_bytes(i)),
+                                   i))
+        if len(nodes) < count:
+            tracker.exceeded('%d of %d nodes' % (len(nodes), count))
+    except budget.OverBudget as e:
+        reprs.append('\n' + budget.truncated(e, val.type, nodes.address))
+    return ''.join(reprs)
 
 def path_state_flags(val):
     flags = int(str(val))
@@ -149,58 +208,232 @@ def path_state_flags(val):
     human = '|'.join(k for k in sorted(yeah) if flags & yeah[k])
     return human
 
-def iterate_stobject_fields(val):
+################################ STOBJECT FIELDS ###############################
+
+# Older rippled called the base SerializedType
+STBASE_NAMES = ('ripple::STBase', 'ripple::SerializedType')
+
+# Per objfile memos: vptr -> is it a bare STBase?, SField* -> names, and
+# SerializedTypeID -> type
+try:
+    vptr_memo
+except NameError:
+    vptr_memo, field_names, sti_types = {}, {}, {}
+    stbase_vptrs = None
+
+def clear_objfile_memos():
+    global stbase_vptrs
+    stbase_vptrs = None
+    for memo in (vptr_memo, field_names, sti_types):
+        memo.clear()
+
+def resolve_base_vptrs():
+    vptrs = set()
+    for name in STBASE_NAMES:
+        try:
+            vtable = gdb.parse_and_eval("(unsigned long)&'vtable for %s'" % name)
+        except gdb.error:
+            continue
+        # Itanium ABI, the vptr points past offset-to-top and the typeinfo
+        vptrs.add(int(vtable) + 2 * pointer_size())
+    return vptrs
+
+def is_base_vptr(vptr):
+    global stbase_vptrs
+
+    known = vptr_memo.get(vptr)
+    if known is None:
+        if stbase_vptrs is None:
+            stbase_vptrs = resolve_base_vptrs()
+
+        if stbase_vptrs:
+            known = vptr in stbase_vptrs
+        else:
+            # No vtable symbols by name, try the msymbol based index
+            known = vtable_index().class_name(vptr) in STBASE_NAMES
+        vptr_memo[vptr] = known
+    return known
+
+def sti_type(code):
+    if not sti_types:
+        for name, t in STI_TO_TYPE_MAPPING.items():
+            sti_types[STI[name.replace('ripple::', '')]] = t
+    return sti_types.get(code)
+
+def sfield_name(sfield, member='fieldName'):
+    key = (sfield, member)
+    name = field_names.get(key)
+    if name is None:
+        field = gdb.Value(sfield).cast(SField.pointer()).dereference()
+        name = field_names[key] = pstd_string(field[member])
+    return name
+
+def sfield_json_name(sfield):
+    return sfield_name(sfield, 'rawJsonName') if sfield else ''
+
+def iterate_stobject_fields(val, tracker=None):
+    '''
+
+    Lazily yields (fieldName, value) for the present fields of an STObject.
+
+    The field pointers, vptrs and SField types are read as raw integers (via
+    the page cache), and compared against integers resolved once, so gdb.Value
+    objects are only made for the fields actually yielded.
+
+    Raises budget.OverBudget (after yielding what fit) when there are more
+    fields, or they take longer, than the budget allows.
+
+    '''
+    tracker = tracker or budget.Tracker(str(val.type))
+
     # mData is a boost::ptr_vector implemented via std::vector `c_`
-    for ptr in iterate_vector(val['mData']['c_']):
-        st_ptr = ptr.cast(SerializedType.pointer())
-
-        # This is nasty, ideally we could get a reference to this vtable address
-        # somehow. In any case, this works, where dynamic_cast was working
-        # before.
-
-        # The reason we filter is because this will just be a base
-        # SerializedType. Which will have STI_NOTPRESENT, and thus typically
-        # getField*() will `if (id == STI_NOTPRESENT) return defaultValue ()` In
-        # any case, we should only show present fields, so we don't get confused
-        # by seeing random bits of memory interpreted as a certain type.
-
-        # TODO:fix obviously
-        vt = st_ptr.dereference()['_vptr.SerializedType']
-        if "vtable for ripple::SerializedType" in str(vt):
+    pointers = VectorView(val['mData']['c_'])
+    if not pointers.count:
+        return
+
+    fname_offset = field_offset(SerializedType, 'fName')
+    (type_offset, type_size) = field_spec(SField, 'fieldType')
+
+    # Don't even read a garbage length's worth of pointers
+    count = pointers.count
+    pointers.limit(tracker.allowed(count))
+
+    for ptr in pointers.scalars():
+        tracker.tick()
+        if ptr == 0:
             continue
 
-        field = st_ptr.dereference()['fName'].dereference()
-        typeImpl = STI_TO_TYPE_MAPPING.get(str(field['fieldType']))
+        # We filter bare STBase, as these will have STI_NOTPRESENT, and thus
+        # typically getField*() will `if (id == STI_NOTPRESENT) return
+        # defaultValue ()` In any case, we should only show present fields, so
+        # we don't get confused by seeing random bits of memory interpreted as
+        # a certain type.
+        if is_base_vptr(read_pointer(ptr)):
+            continue
 
-        if typeImpl is not None:
-            sub_ptr = typeImpl.pointer()
-            casted = st_ptr.cast(sub_ptr)
+        sfield = read_pointer(ptr + fname_offset)
+        typeImpl = sti_type(read_uint(sfield + type_offset, type_size))
+        if typeImpl is None:
+            # A SerializedTypeID we don't map (eg. from a newer rippled), so
+            # go by the object's vtable instead
+            typeImpl = vtable_index().type_of(read_pointer(ptr))
 
-            if casted != 0:
-                fieldName = pstd_string(field['fieldName'])
-                yield (fieldName, casted.dereference())
+        if typeImpl is not None:
+            casted = gdb.Value(ptr).cast(typeImpl.pointer())
+            field = (sfield_name(sfield), casted.dereference())
+            # Whatever the caller does with the field is on its own clock
+            tracker.pause()
+            try:
+                yield field
+            finally:
+                tracker.resume()
+
+    if pointers.count < count:
+        tracker.exceeded('%d of %d fields' % (pointers.count, count))
+
+# Fields holding an enum value, which we show symbolically
+ENUM_FIELDS = dict(LedgerEntryType=LET,
+                   TransactionType=TXT)
+
+def enum_field_name(fieldName, value):
+    'The symbolic name for an ENUM_FIELDS value, or None'
+    if fieldName in ENUM_FIELDS:
+        try:
+            n = int(str(value))
+        except:
+            pass
+        else:
+            return ENUM_FIELDS[fieldName][n]
+
+def enum_field_value(fieldName, value):
+    'An ENUM_FIELDS value cast to its enum, or None'
+    if fieldName in ENUM_FIELDS:
+        try:
+            return ENUM_FIELDS[fieldName].value(int(str(value)))
+        except (ValueError, gdb.error):
+            pass
 
 def pLedgerEntry(val):
     if val.address == 0:
         return
     else:
-        fields = sorted(iterate_stobject_fields(val))
+        fields = []
+        try:
+            fields.extend(iterate_stobject_fields(val))
+        except budget.OverBudget as e:
+            fields.append(('~', budget.truncated(e, val.type,
+                                                 int(val.address))))
+        except gdb.MemoryError as e:
+            fields.append(('~', unreadable(e, int(val.address))))
+        fields.sort()
 
         def dorep(fieldName, value):
-            types = dict(LedgerEntryType=LET,
-                         TransactionType=TXT)
+            symbolic = enum_field_name(fieldName, value)
+            return str(value) if symbolic is None else symbolic
 
-            if fieldName in types:
-                try:
-                    n = int(str(value))
-                except:
-                    pass
-                else:
-                    return types[fieldName][n]
+        return '\n' + '\n'.join("%-20s%s" % (k+':', dorep(k, v)) for (k,v) in fields )
 
-            return str(value)
+class STObjectPrinter:
+    '''
 
-        return '\n' + '\n'.join("%-20s%s" % (k+':', dorep(k, v)) for (k,v) in fields )
+    Prints an STObject (or STLedgerEntry) as a map of its present fields.
+
+    Fields are only read, and formatted, as gdb asks for them, so `set print
+    elements`, MI varobjs and IDEs only pay for the fields actually shown.
+
+    '''
+    def __init__(self, val):
+        if val.type.code == gdb.TYPE_CODE_PTR and val != 0:
+            val = val.dereference()
+        self.val = val
+
+    def is_null(self):
+        return (self.val.type.code == gdb.TYPE_CODE_PTR or
+                self.val.address == 0)
+
+    def to_string(self):
+        if self.is_null():
+            return '0x0'
+
+    def children(self):
+        if self.is_null():
+            return
+
+        key = render_memo.key(self.val, 'children')
+        if key is not None:
+            try:
+                yield from render_memo.get(key)
+                return
+            except KeyError:
+                pass
+
+        # Only memoized when gdb asks for every child, and they all fit
+        rendered = []
+        fields = iterate_stobject_fields(self.val)
+        i = 0
+        try:
+            for (i, (fieldName, value)) in enumerate(fields, 1):
+                symbolic = enum_field_value(fieldName, value)
+                for child in (('[%d]' % (2 * i - 2), fieldName),
+                              ('[%d]' % (2 * i - 1), value if symbolic is None
+                                                          else symbolic)):
+                    rendered.append(child)
+                    yield child
+        except budget.OverBudget as e:
+            yield ('[%d]' % (2 * i), 'truncated')
+            yield ('[%d]' % (2 * i + 1), budget.truncated(
+                   e, self.val.type, int(self.val.address)))
+            return
+        except gdb.MemoryError as e:
+            yield ('[%d]' % (2 * i), 'unreadable')
+            yield ('[%d]' % (2 * i + 1), unreadable(e, int(self.val.address)))
+            return
+
+        if key is not None:
+            render_memo.put(key, rendered)
+
+    def display_hint(self):
+        return 'map'
 
 def pLedgerEntryPointer(val):
     return pLedgerEntry(val['_M_ptr'].dereference())
@@ -219,6 +452,9 @@ def node_offer(val):
         return '<empty>'
 
 def pNode(val, index=None):
+    return node_repr(decode(val), index)
+
+def node_repr(d, index=None):
     # We should eventually use some kind of kick arse indentation aware templat
     # ing language.
 
@@ -241,12 +477,13 @@ def pNode(val, index=None):
 
       ofr: %(offerIndex_)s %(sleOffer)s
 
-""".format(ix=index)) % Proxy(val,
-        sleOffer=node_offer,
-        uFlags=path_state_flags)
-
-def pSTObject(value):
-    return pLedgerEntry(value)
+""".format(ix=index)) % dict(
+        uFlags      = path_state_flags(d.uint('uFlags')),
+        account_    = uint160_repr(d.bytes('account_.pn')),
+        currency_   = uint160_repr(d.bytes('currency_.pn'), currency=True),
+        issuer_     = uint160_repr(d.bytes('issuer_.pn')),
+        offerIndex_ = hex_encode(d.bytes('offerIndex_.pn')),
+        sleOffer    = node_offer(d.value('sleOffer')))
 
 def pSTArray(value):
     return "TODO: STArray"
@@ -255,10 +492,18 @@ def pSTPathSet(value):
     return "TODO: STPathSet"
 
 def pSTVector256(value):
-    return repr(list(map(str, iterate_vector(value['mValue'])))).replace("'", '')
+    hashes = VectorView(value['mValue'])
+    count = len(hashes)
+    hashes.limit(budget.Tracker(str(value.type)).allowed(count))
+    reprs = [hex_encode(hashes.item_bytes(i)) for i in range(len(hashes))]
+    if len(hashes) < count:
+        budget.over_budget[str(value.type)] += 1
+        reprs.append(budget.truncated('%d of %d hashes' % (len(hashes), count),
+                                      value.type, hashes.address))
+    return '[%s]' % ', '.join(reprs)
 
 def pSTBlob(value):
-    return hex_encode(read_blob(value['value']))
+    return hex_encode(blob_bytes(value['value']))
 
 def pJsonCZString(value):
     'represents an int index into an [] or a string index into a {}'
@@ -306,7 +551,7 @@ class RipplePrinter(gdb.printing.PrettyPrinter):
 
         'ripple::base_uint<256ul, void>' : pUintAll,
         'ripple::uint256' : pUintAll,
-        'ripple::Blob' : lambda v: hex_encode(read_blob(v)),
+        'ripple::Blob' : lambda v: hex_encode(blob_bytes(v)),
 
         'ripple::STAmount':   pSTAmount,
         'ripple::STAccount':  pSTAccount,
@@ -319,14 +564,15 @@ class RipplePrinter(gdb.printing.PrettyPrinter):
         'ripple::STUInt32':  lambda o: o['value_'],
         'ripple::STUInt64':  lambda o: ("{0:0{1}x}".format(int(o['value_']), 16)),
 
-        'ripple::STObject'  : pSTObject,
+        'ripple::STObject'  : STObjectPrinter,
         'ripple::STArray'  : pSTArray,
         'ripple::STPathSet'  : pSTPathSet,
         'ripple::STVector256'  : pSTVector256,
         'ripple::STBlob'  : pSTBlob,
 
-        'ripple::STLedgerEntry':  pLedgerEntry,
-        'ripple::core::Quality':  lambda o: pQuality(o['m_value']),
+        'ripple::STLedgerEntry':  STObjectPrinter,
+        'ripple::core::Quality':  lambda o: quality_repr(
+                                                decode(o).uint('m_value')),
         'ripple::core::Offer':  pOffer,
 
         'ripple::PathState':  pPathState,
@@ -334,45 +580,160 @@ class RipplePrinter(gdb.printing.PrettyPrinter):
     }
 
     def __init__(self):
-        for k in RipplePrinter.aliases:
-            gdb.lookup_type(k)
-
+        # Lazily, types are matched by name and only resolved by gdb itself
+        # when a value of that type is printed.
+        if not ripplegdb.LAZY:
+            for k in RipplePrinter.aliases:
+                gdb.lookup_type(k)
+
+        # type key -> printer function, or None for types that aren't ours
+        self.dispatch = {}
         super(RipplePrinter, self).__init__('RipplePrinter')
 
-    def to_string(self):
-        (fn, ) = self.fn
-        return fn(self.val)
+    def clear_dispatch(self, event=None):
+        self.dispatch.clear()
+        clear_objfile_memos()
 
-    def try_types(self, val):
-        def fancy():
-            t = val.type
-            yield t.name, val
+    @staticmethod
+    def type_key(t):
+        # gdb.Type isn't hashable, pointers and references have no name
+        return t.name or str(t)
 
-            if t.code == gdb.TYPE_CODE_PTR:
-                try:
-                    yield t.target().name, val.dereference()
-                except Exception as e:
-                    print(e)
+    def resolve(self, t):
+        names = [t.name]
 
-            yield gdb.types.get_basic_type(t).tag, val
+        if t.code == gdb.TYPE_CODE_PTR:
+            names.append(t.target().name)
 
-        yield from ((k,v) for (k,v) in fancy() if k is not None)
+        names.append(gdb.types.get_basic_type(t).tag)
+
+        for typename in names:
+            if typename is not None:
+                fn = self.aliases.get(typename)
+                if fn is not None:
+                    return fn
+
+    def printer_for(self, t):
+        'The alias for t (resolved once per type), or None'
+        key = self.type_key(t)
+        try:
+            return self.dispatch[key]
+        except KeyError:
+            fn = self.dispatch[key] = self.resolve(t)
+            return fn
 
     def __call__(self, val):
         if not RipplePrinter.on: return
-        # print("---- RipplePrinter ----")
 
-        for typename, value in self.try_types(val):
-            # print("typename", typename)
+        fn = self.printer_for(val.type)
 
-            if typename is not None:
-                ripple_type = typename
-                fn = self.aliases.get(ripple_type)
-                self.fn = (fn, )
-                self.val = val
-                if fn is not None:
-                    return self
-                else:
-                    pass
+        if isinstance(fn, type):
+            # A printer class, that may provide children() etc.
+            return fn(val)
+        elif fn is not None:
+            return RippleValuePrinter(fn, val)
 
-gdb.printing.register_pretty_printer(None, RipplePrinter(), replace=True)
+class RippleValuePrinter:
+    'A printer for one value, so nested printing never clobbers state'
+
+    def __init__(self, fn, val):
+        self.fn = fn
+        self.val = val
+
+    def to_string(self):
+        key = render_memo.key(self.val, 'to_string')
+        if key is not None:
+            try:
+                return render_memo.get(key)
+            except KeyError:
+                pass
+
+        address = self.val.address
+        address = int(address) if address is not None else None
+        truncations = budget.truncations()
+        try:
+            rendered = self.fn(self.val)
+        except budget.OverBudget as e:
+            rendered = budget.truncated(e, self.val.type, address)
+        except gdb.MemoryError as e:
+            rendered = unreadable(e, address)
+        except InvalidSize as e:
+            rendered = str(e)
+
+        # Anything cut short (here or by a printer within) isn't memoized, a
+        # later look may have more time
+        if key is None or budget.truncations() != truncations:
+            return rendered
+        return render_memo.put(key, rendered)
+
+################################## RENDER MEMO #################################
+
+class RenderMemo:
+    '''
+
+    Rendered output, keyed by (address, type, what), for as long as memory
+    can't have changed, ie. the page cache generation. So the same value seen
+    in many frames of `bt full`, or refreshed by an IDE, is rendered once.
+
+    Bounded, evicting the least recently used.
+
+    '''
+    def __init__(self, size=4096):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.enabled = True
+        self.generation = None
+        self.hits = self.misses = self.evictions = 0
+
+    def key(self, val, what):
+        if not self.enabled or val.address is None:
+            return None
+        generation = ripplegdb.values.page_cache.generation
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+        return (int(val.address), RipplePrinter.type_key(val.type), what)
+
+    def get(self, key):
+        found = self.entries[key]
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return found
+
+    def put(self, key, rendered):
+        self.misses += 1
+        self.entries[key] = rendered
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return rendered
+
+    def clear(self):
+        self.entries.clear()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return dict(entries=len(self.entries), size=self.size,
+                    hits=self.hits, misses=self.misses,
+                    evictions=self.evictions,
+                    hit_rate=(self.hits / total) if total else 0.0)
+
+# Fresh on every (re)load, what the old one holds was rendered by the old
+# printers
+render_memo = RenderMemo()
+
+# Types are per objfile, so forget what we resolved when rippled is
+# (re)loaded, but not for every shared library
+try:              disconnect_dispatch()
+except NameError: pass
+
+ripple_printer = RipplePrinter()
+clear_dispatch = if_rippled(ripple_printer.clear_dispatch)
+gdb.events.new_objfile.connect(clear_dispatch)
+disconnect_dispatch = functools.partial(gdb.events.new_objfile.disconnect,
+                                        clear_dispatch)
+
+gdb.printing.register_pretty_printer(None, ripple_printer, replace=True)
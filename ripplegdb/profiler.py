@@ -0,0 +1,215 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import os
+import re
+import time
+import signal
+import collections
+
+# Gdb
+import gdb
+
+# Ours
+from ripplegdb import stacks
+from ripplegdb.enums import LET, TXT, TER, STI
+
+##################################### DOCS #####################################
+"""
+
+A poor man's sampling profiler: interrupt the (live) inferior HZ times a
+second, grab every thread's PCs, and continue straight away. Symbolizing is
+left until the end, through the stacks cache, so each sample keeps the process
+stopped for as little time as we can manage.
+
+Output is folded stacks (`outer;inner;innermost count` lines), as consumed by
+flamegraph.pl, speedscope and friends.
+
+Frames of chosen functions can be annotated with a value, eg. the TxType:
+
+    rprofile -a 'ripple::Transactor::apply:ctx_.tx.getTxnType():TxType'
+
+Interrupts are sent by a forked child, as python threads don't get to run
+while gdb.execute('continue') blocks in the main thread.
+
+"""
+################################### CONSTANTS ##################################
+
+ENUMS = dict(TxType=TXT, TXT=TXT,
+             LedgerEntryType=LET, LET=LET,
+             TER=TER,
+             SerializedTypeID=STI, STI=STI)
+
+LONE_COLON_RX = re.compile(r'(?<!:):(?!:)')
+
+SIGINT_SAMPLING = 'handle SIGINT stop noprint nopass'
+
+# Stop, Print, Pass to program, as `info signals` shows them
+SIGINT_SETTINGS = (('stop', 'nostop'), ('print', 'noprint'),
+                   ('pass', 'nopass'))
+
+################################## ANNOTATIONS #################################
+
+Annotation = collections.namedtuple('Annotation', 'function expression enum')
+
+def parse_annotation(spec):
+    '''
+
+    FUNC:EXPR[:ENUM], splitting only on lone colons so C++ names work. ENUM
+    is one of ENUMS.
+
+    '''
+    parts = LONE_COLON_RX.split(spec)
+    if len(parts) == 3 and parts[2] not in ENUMS:
+        raise ValueError('unknown enum %s, use one of %s' % (
+                         parts[2], ', '.join(sorted(ENUMS))))
+    if len(parts) not in (2, 3):
+        raise ValueError('expected FUNC:EXPR[:ENUM], not %s' % spec)
+    return Annotation(parts[0], parts[1],
+                      ENUMS[parts[2]] if len(parts) == 3 else None)
+
+def matches(name, function):
+    return name == function or name.startswith(function + '(')
+
+def annotate(frame, annotation):
+    'The label for a frame, or None when the expression fails'
+    try:
+        frame.select()
+        value = gdb.parse_and_eval(annotation.expression)
+        if annotation.enum is not None:
+            n = int(value)
+            return annotation.enum.get(n, n)
+        return value.format_string(raw=True) if hasattr(
+                               value, 'format_string') else str(value)
+    except (gdb.error, ValueError):
+        return None
+
+################################### SAMPLING ###################################
+
+class Interrupter:
+    '''
+
+    A forked child which, each time it's told to, waits `interval` then
+    SIGINTs pid.
+
+    '''
+    def __init__(self, pid, interval):
+        (read_fd, self.write_fd) = os.pipe()
+        self.child = os.fork()
+        if self.child == 0:
+            os.close(self.write_fd)
+            try:
+                while os.read(read_fd, 1):
+                    time.sleep(interval)
+                    os.kill(pid, signal.SIGINT)
+            finally:
+                os._exit(0)
+        os.close(read_fd)
+
+    def arm(self):
+        os.write(self.write_fd, b'.')
+
+    def close(self):
+        # It may still be waiting to send an interrupt we no longer want
+        os.kill(self.child, signal.SIGKILL)
+        os.close(self.write_fd)
+        os.waitpid(self.child, 0)
+
+class Profile:
+    def __init__(self, annotations=()):
+        self.annotations = list(annotations)
+        # (thread name, pcs, labels) -> samples
+        self.samples = collections.Counter()
+        self.rounds = 0
+        self.paused = 0.0
+
+    def sample(self):
+        started = time.perf_counter()
+
+        def visit(thread, pcs):
+            labels = self.labels(pcs) if self.annotations else ()
+            self.samples[(thread.name or '', pcs, labels)] += 1
+
+        stacks.thread_stacks(visit=visit)
+        self.rounds += 1
+        self.paused += time.perf_counter() - started
+
+    def labels(self, pcs):
+        '((frame index, label), ...) for frames of annotated functions'
+        labels = []
+        frames = None
+        for (i, pc) in enumerate(pcs):
+            name = stacks.function_name(pc)
+            for annotation in self.annotations:
+                if matches(name, annotation.function):
+                    frames = frames or stacks.frames(len(pcs))
+                    if i < len(frames):
+                        label = annotate(frames[i], annotation)
+                        if label is not None:
+                            labels.append((i, '%s=%s' % (
+                                          annotation.expression, label)))
+        return tuple(labels)
+
+    def folded(self):
+        'Folded stack lines, outermost frame first'
+        lines = collections.Counter()
+        for ((thread, pcs, labels), n) in self.samples.items():
+            names = [stacks.function_name(pc) for pc in pcs]
+            for (i, label) in labels:
+                names[i] = '%s [%s]' % (names[i], label)
+            if thread:
+                names.append(thread)
+            lines[';'.join(reversed(names))] += n
+        return ['%s %d' % (stack, n) for (stack, n) in
+                sorted(lines.items(), key=lambda i: -i[1])]
+
+def sigint_handling():
+    'The `handle SIGINT ...` restoring how SIGINT is handled right now'
+    info = gdb.execute('info signals SIGINT', to_string=True)
+    for line in info.splitlines():
+        words = line.split()
+        if words and words[0] == 'SIGINT' and len(words) >= 4:
+            return 'handle SIGINT ' + ' '.join(
+                   yes if word == 'Yes' else no
+                   for ((yes, no), word) in zip(SIGINT_SETTINGS, words[1:4]))
+    raise gdb.GdbError("can't tell how SIGINT is handled from: %s" % info)
+
+def stopped_by_sigint(event):
+    return (isinstance(event, gdb.SignalEvent) and
+            event.stop_signal == 'SIGINT')
+
+def profile(hz, seconds, annotations=()):
+    '''
+
+    Samples the live inferior for `seconds`, returning the Profile. Stops
+    early when the inferior stops for any other reason (eg. a breakpoint, or
+    exiting).
+
+    '''
+    inferior = gdb.selected_inferior()
+    if not inferior.pid:
+        raise gdb.GdbError('the inferior must be running')
+
+    result = Profile(annotations)
+    stops = []
+    record = stops.append
+
+    restore_sigint = sigint_handling()
+    interrupter = Interrupter(inferior.pid, 1.0 / hz)
+    gdb.events.stop.connect(record)
+    gdb.execute(SIGINT_SAMPLING, to_string=True)
+    try:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            del stops[:]
+            interrupter.arm()
+            gdb.execute('continue', to_string=True)
+            if not inferior.pid or not stops or \
+               not stopped_by_sigint(stops[-1]):
+                break
+            result.sample()
+    finally:
+        gdb.events.stop.disconnect(record)
+        interrupter.close()
+        gdb.execute(restore_sigint, to_string=True)
+    return result
@@ -2,18 +2,56 @@
 
 # Std lib
 import os
+import threading
 from os.path import dirname, abspath, normpath, join
 from functools import partial
 
 # Gdb
 import gdb
 
+# Ours
+import ripplegdb
+
 WORKING_DIR          = dirname(abspath(__file__))
 working_dir_relative = lambda *p: normpath(join(WORKING_DIR, *p))
 
+# Editors tend to write a burst of files (and some write twice), so wait for
+# things to go quiet before reloading whatever changed.
+DEBOUNCE_SECONDS = 0.25
+
+class Debouncer:
+    def __init__(self, delay, flush):
+        self.delay = delay
+        self.flush = flush
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, path):
+        with self.lock:
+            self.pending.add(path)
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.fire)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def fire(self):
+        with self.lock:
+            paths, self.pending = self.pending, set()
+            self.timer = None
+        if paths:
+            # gdb's api is only safe to use from its own thread
+            gdb.post_event(partial(self.flush, sorted(paths)))
+
 def on_reload_event(event):
     if event.pathname.endswith('.py'):
-        gdb.execute('rlr', from_tty=False)
+        debouncer.add(event.pathname)
+
+def reload_changed(paths):
+    ripplegdb.reload_changed(paths)
+
+debouncer = Debouncer(DEBOUNCE_SECONDS, reload_changed)
 
 def create_watcher():
     from pyinotify import WatchManager, Notifier, ThreadedNotifier, \
@@ -23,8 +61,7 @@ def create_watcher():
 
     class PTmp(ProcessEvent):
         def process_IN_CLOSE_WRITE(self, event):
-            def inner(): on_reload_event(event)
-            gdb.post_event(inner)
+            on_reload_event(event)
 
     notifier = ThreadedNotifier(wm, PTmp())
     wdd = wm.add_watch(WORKING_DIR, mask, rec=True)
@@ -38,4 +75,4 @@ def create_watcher():
 try:
     notifier
 except NameError:
-    (notifier, wdd) = create_watcher()
\ No newline at end of file
+    (notifier, wdd) = create_watcher()
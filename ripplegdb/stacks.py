@@ -0,0 +1,172 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import functools
+import collections
+
+# Gdb
+import gdb
+
+# Ours
+from ripplegdb.helpers import if_rippled
+
+##################################### DOCS #####################################
+"""
+
+Collecting every thread's stack as cheaply as we can: just a tuple of PCs,
+unwound from gdb.newest_frame(). Turning PCs into function names (and source
+lines) is the expensive bit, so it's done later, once per distinct PC, via
+a cache that lives until rippled is (re)loaded.
+
+The PCs of caller frames are return addresses, just past the call, which may
+be in the next function (after a noreturn or tail call), so they're looked
+up as pc - 1, as gdb's own backtrace does. The innermost frame, signal
+handler frames and frames interrupted by a signal have exact PCs.
+
+Inline frames share the pc of the real frame they were inlined into, so
+whether a frame's pc is a return address depends on its nearest non-inline
+callee: a call (or tail call) means it is, a signal trampoline that it isn't.
+
+"""
+################################### CONSTANTS ##################################
+
+MAX_DEPTH = 128
+
+# Frames whose pc is a return address, when their callee was called
+CALLING_FRAMES = frozenset([gdb.NORMAL_FRAME, gdb.TAILCALL_FRAME,
+                            gdb.INLINE_FRAME])
+CALLED_FRAMES = frozenset([gdb.NORMAL_FRAME, gdb.TAILCALL_FRAME])
+
+# A frame's pc, and whether it's exact, rather than a return address
+FramePC = collections.namedtuple('FramePC', 'pc exact')
+
+################################## COLLECTING ##################################
+
+def pc_chain(max_depth=MAX_DEPTH):
+    'The FramePCs of the selected thread, innermost first'
+    pcs = []
+    frame = gdb.newest_frame()
+    # The kind of the nearest non-inline frame seen, inline ones are skipped
+    callee = None
+    while frame is not None and len(pcs) < max_depth:
+        kind = frame.type()
+        exact = not (kind in CALLING_FRAMES and callee in CALLED_FRAMES)
+        pcs.append(FramePC(frame.pc(), exact))
+        if kind != gdb.INLINE_FRAME:
+            callee = kind
+        try:
+            frame = frame.older()
+        except gdb.error:
+            break
+    return tuple(pcs)
+
+def frames(max_depth=MAX_DEPTH):
+    'The gdb.Frames of the selected thread, innermost first'
+    found = []
+    frame = gdb.newest_frame()
+    while frame is not None and len(found) < max_depth:
+        found.append(frame)
+        try:
+            frame = frame.older()
+        except gdb.error:
+            break
+    return found
+
+def thread_stacks(max_depth=MAX_DEPTH, visit=None):
+    '''
+
+    [(gdb.InferiorThread, pcs)] for every thread of the selected inferior.
+
+    visit(thread, pcs), when given, is called with each thread still
+    selected, eg. to evaluate expressions in its frames. The originally
+    selected thread is reselected afterwards.
+
+    '''
+    selected = gdb.selected_thread()
+    stacks = []
+    try:
+        for thread in gdb.selected_inferior().threads():
+            if not thread.is_valid() or thread.is_exited():
+                continue
+            thread.switch()
+            try:
+                pcs = pc_chain(max_depth)
+            except gdb.error:
+                continue
+            if visit is not None:
+                visit(thread, pcs)
+            stacks.append((thread, pcs))
+    finally:
+        if selected is not None and selected.is_valid():
+            selected.switch()
+    return sorted(stacks, key=lambda s: s[0].num)
+
+def group_stacks(stacks):
+    '[(pcs, [thread, ...])] of identical PC chains, most threads first'
+    groups = collections.OrderedDict()
+    for (thread, pcs) in stacks:
+        groups.setdefault(pcs, []).append(thread)
+    return sorted(groups.items(), key=lambda g: -len(g[1]))
+
+################################# SYMBOLIZING ##################################
+
+# FramePC -> (function, file, line), survives reloads but not a new rippled
+# objfile
+try:
+    symbols
+except NameError:
+    symbols = {}
+
+def symbolize(pc):
+    '(function name, source file or None, line or 0) for a FramePC (or pc)'
+    if not isinstance(pc, FramePC):
+        pc = FramePC(pc, True)
+    found = symbols.get(pc)
+    if found is None:
+        found = symbols[pc] = lookup_pc(pc.pc if pc.exact or not pc.pc
+                                        else pc.pc - 1)
+    return found
+
+def function_name(pc):
+    return symbolize(pc)[0]
+
+def format_pc(pc):
+    (name, filename, line) = symbolize(pc)
+    address = pc.pc if isinstance(pc, FramePC) else pc
+    if filename is None:
+        return '0x%016x in %s' % (address, name)
+    return '0x%016x in %s at %s:%d' % (address, name, filename, line)
+
+def lookup_pc(pc):
+    'Symbolizes pc, already adjusted to be within the call for callers'
+    name = None
+    try:
+        block = gdb.block_for_pc(pc)
+    except RuntimeError:
+        block = None
+    while block is not None and block.function is None:
+        block = block.superblock
+    if block is not None:
+        name = block.function.print_name
+
+    if name is None:
+        info = gdb.execute('info symbol 0x%x' % pc, to_string=True)
+        if not info.startswith('No symbol'):
+            name = info.split(' in section ')[0].split(' + ')[0].strip()
+    if name is None:
+        name = '0x%x' % pc
+
+    sal = gdb.find_pc_line(pc)
+    filename = sal.symtab.filename if sal.symtab is not None else None
+    return (name, filename, sal.line)
+
+try:              disconnect_symbols()
+except NameError: pass
+
+@if_rippled
+def clear_symbols(event=None):
+    symbols.clear()
+
+gdb.events.new_objfile.connect(clear_symbols)
+disconnect_symbols = functools.partial(gdb.events.new_objfile.disconnect,
+                                       clear_symbols)
@@ -0,0 +1,220 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import time
+import functools
+import collections
+
+# Gdb
+import gdb
+
+# Ours
+import ripplegdb
+from ripplegdb import values
+
+##################################### DOCS #####################################
+"""
+
+Optional instrumentation of the printers, to find which one makes a slow
+backtrace slow. When enabled (`rstats on`), every function in
+printers.registry and RipplePrinter.aliases, and every libcpp subprinter, is
+wrapped to record per printer:
+
+    - calls, cumulative and p99 wall time (printer classes are timed over
+      to_string() and the whole of children())
+    - bytes read via values.read_memory (read_value, decoders ...)
+    - gdb.Value subscripts, of the value passed in and those subscripts
+      return, ie. `val['a']['b']` is 2.
+
+Time and bytes are inclusive of any nested printers.
+
+"""
+################################### CONSTANTS ##################################
+
+# Durations kept per printer, for the p99
+SAMPLES = 10000
+
+##################################### STATS ####################################
+
+class Stat:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.subscripts = 0
+        self.samples = collections.deque(maxlen=SAMPLES)
+
+    def record(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        self.samples.append(seconds)
+
+    def p99(self):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[int(0.99 * (len(ordered) - 1))]
+
+    def mean(self):
+        return self.seconds / self.calls if self.calls else 0.0
+
+# printer name -> Stat, and the Stats of the printers running right now
+try:
+    stats
+except NameError:
+    stats = collections.OrderedDict()
+    active = []
+
+def stat_for(name):
+    stat = stats.get(name)
+    if stat is None:
+        stat = stats[name] = Stat(name)
+    return stat
+
+def on_read(n):
+    for stat in active:
+        stat.bytes += n
+
+def reset():
+    stats.clear()
+
+def ranked():
+    return sorted(stats.values(), key=lambda s: -s.seconds)
+
+################################## SUBSCRIPTS ##################################
+
+class CountingValue(gdb.Value):
+    'A gdb.Value counting its (and its subscripts\') subscripts into stat'
+
+    def __new__(cls, val, stat):
+        return super(CountingValue, cls).__new__(cls, val)
+
+    def __init__(self, val, stat):
+        try:
+            # Newer gdbs initialize in __init__, older ones in __new__
+            super(CountingValue, self).__init__(val)
+        except TypeError:
+            pass
+        self.stat = stat
+
+    def __getitem__(self, key):
+        self.stat.subscripts += 1
+        return CountingValue(super(CountingValue, self).__getitem__(key),
+                             self.stat)
+
+def counting(val, stat):
+    if not isinstance(val, gdb.Value) or isinstance(val, CountingValue):
+        return val
+    try:
+        return CountingValue(val, stat)
+    except TypeError:
+        # An older gdb that won't let gdb.Value be subclassed
+        return val
+
+################################### WRAPPING ###################################
+
+def timed_call(stat, f, *args, **kw):
+    active.append(stat)
+    started = time.perf_counter()
+    try:
+        return f(*args, **kw)
+    finally:
+        stat.record(time.perf_counter() - started)
+        active.pop()
+
+def timed_children(stat, children):
+    'Times the whole iteration of children, recorded as one call'
+    seconds = 0.0
+    try:
+        while True:
+            active.append(stat)
+            started = time.perf_counter()
+            try:
+                child = next(children)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - started
+                active.pop()
+            yield child
+    finally:
+        stat.record(seconds)
+
+def wrap_function(name, f):
+    stat = stat_for(name)
+
+    @functools.wraps(f)
+    def wrapper(*args, **kw):
+        args = [counting(a, stat) for a in args]
+        return timed_call(stat, f, *args, **kw)
+    wrapper.original = f
+    return wrapper
+
+def wrap_class(name, cls):
+    'A subclass of a printer class, timing to_string() and children()'
+    stat = stat_for(name)
+    methods = dict(original=cls)
+
+    def __init__(self, *args):
+        args = [counting(a, stat) for a in args]
+        cls.__init__(self, *args)
+    methods['__init__'] = __init__
+
+    if hasattr(cls, 'to_string'):
+        def to_string(self):
+            return timed_call(stat, cls.to_string, self)
+        methods['to_string'] = to_string
+
+    if hasattr(cls, 'children'):
+        def children(self):
+            return timed_children(stat, iter(cls.children(self)))
+        methods['children'] = children
+
+    return type(cls.__name__, (cls, ), methods)
+
+def wrap(name, f):
+    if isinstance(f, type):
+        return wrap_class(name, f)
+    return wrap_function(name, f)
+
+def unwrap(f):
+    return getattr(f, 'original', f)
+
+################################### SWITCHING ##################################
+
+def printer_tables():
+    'The {name: printer} tables we instrument'
+    printers = ripplegdb.printers
+    return [printers.registry, printers.RipplePrinter.aliases]
+
+def libcpp_subprinters():
+    printer = ripplegdb.libcpp.libstdcxx_printer
+    return printer.subprinters if printer is not None else []
+
+def is_wrapped(f):
+    return hasattr(f, 'original')
+
+def enabled():
+    return values.on_read is not None
+
+def enable():
+    for table in printer_tables():
+        for (name, f) in list(table.items()):
+            if not is_wrapped(f):
+                table[name] = wrap(name, f)
+    for rx in libcpp_subprinters():
+        if not is_wrapped(rx.function):
+            rx.function = wrap(rx.name, rx.function)
+    values.on_read = on_read
+    ripplegdb.printers.ripple_printer.dispatch.clear()
+
+def disable():
+    for table in printer_tables():
+        for (name, f) in list(table.items()):
+            table[name] = unwrap(f)
+    for rx in libcpp_subprinters():
+        rx.function = unwrap(rx.function)
+    values.on_read = None
+    del active[:]
+    ripplegdb.printers.ripple_printer.dispatch.clear()
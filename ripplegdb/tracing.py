@@ -0,0 +1,184 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import csv
+import json
+import functools
+import time
+import collections
+
+# Gdb
+import gdb
+import gdb.types
+
+# Ours
+from ripplegdb import values
+from ripplegdb.values import InvalidSize
+from ripplegdb.decoders import decode, REFERENCE_CODES
+from ripplegdb.printers import ripple_printer, amount_to_decimal, \
+                               uint160_repr, STAMOUNT_FIELDS
+
+##################################### DOCS #####################################
+"""
+
+Breakpoints that never stop: each hit evaluates some expressions, records
+them into a fixed size ring buffer, and lets the inferior carry on. Records
+are written out in batches, as json lines, or csv when the file ends in .csv.
+
+    rtrace ripple::path::RippleCalc::rippleCalculate saDstAmountAct
+
+STAmounts are decoded from their raw bytes (so are exact decimals), other
+ripple types go through the RipplePrinter aliases.
+
+A hit that doesn't stop fires no stop/cont events, so the page cache (and
+with it the render memo) is cleared by hand on every hit, else later hits
+would record the memory, and renderings, of the first.
+
+"""
+################################### CONSTANTS ##################################
+
+RING_SIZE = 10000
+BATCH_SIZE = 500
+
+SCALAR_CODES = (gdb.TYPE_CODE_INT, gdb.TYPE_CODE_ENUM, gdb.TYPE_CODE_BOOL,
+                gdb.TYPE_CODE_CHAR)
+
+################################### CAPTURE ####################################
+
+def capture(val):
+    'A json friendly rendering of val'
+    if val.type.code in REFERENCE_CODES:
+        val = val.referenced_value()
+
+    basic = gdb.types.get_basic_type(val.type)
+    if basic.tag == 'ripple::STAmount':
+        d = decode(val)
+        currency = d.bytes(*STAMOUNT_FIELDS['currency'])
+        issuer = d.bytes(*STAMOUNT_FIELDS['issuer'])
+        return dict(value=str(amount_to_decimal(d)),
+                    currency=uint160_repr(currency, True),
+                    issuer=uint160_repr(issuer))
+
+    fn = ripple_printer.printer_for(val.type)
+    if fn is not None and not isinstance(fn, type):
+        return str(fn(val))
+    if basic.code in SCALAR_CODES:
+        return int(val)
+    return str(val)
+
+def flatten(value):
+    'For csv, eg. an amount as value/currency/issuer'
+    if isinstance(value, dict):
+        return '/'.join(str(v) for v in value.values())
+    return value
+
+################################## BREAKPOINTS #################################
+
+class TraceBreakpoint(gdb.Breakpoint):
+    def __init__(self, location, expressions, path=None,
+                 ring_size=RING_SIZE, batch_size=BATCH_SIZE):
+        super(TraceBreakpoint, self).__init__(location)
+        self.expressions = list(expressions)
+        self.path = path
+        self.ring = collections.deque(maxlen=ring_size)
+        self.batch_size = batch_size
+        self.pending = []
+        self.hits = self.errors = self.dropped = 0
+        self.seconds = 0.0
+
+    def stop(self):
+        started = time.perf_counter()
+        self.hits += 1
+        # The inferior ran since the last hit, without an invalidating event
+        values.page_cache.clear()
+
+        record = collections.OrderedDict(
+            time=time.time(), hit=self.hits, thread=gdb.selected_thread().num)
+        for expression in self.expressions:
+            try:
+                record[expression] = capture(gdb.parse_and_eval(expression))
+            except (gdb.error, gdb.MemoryError) as e:
+                self.errors += 1
+                record[expression] = '<error: %s>' % e
+            except InvalidSize as e:
+                record[expression] = str(e)
+            except Exception as e:
+                # eg. a value in a register, or optimized out, has no address.
+                # Whatever it is, a trace must never stop the inferior.
+                self.errors += 1
+                record[expression] = '<error: %s: %s>' % (type(e).__name__, e)
+
+        if len(self.ring) == self.ring.maxlen and self.path is None:
+            self.dropped += 1
+        self.ring.append(record)
+
+        if self.path is not None:
+            self.pending.append(record)
+            if len(self.pending) >= self.batch_size:
+                try:
+                    self.flush()
+                except Exception as e:
+                    self.errors += 1
+                    gdb.write('rtrace %d: flush failed: %s\n' % (
+                              self.number, e), gdb.STDERR)
+
+        self.seconds += time.perf_counter() - started
+        return False
+
+    def flush(self):
+        if not self.pending or self.path is None:
+            return 0
+        with open(self.path, 'a', newline='') as fh:
+            if self.path.endswith('.csv'):
+                fields = ['time', 'hit', 'thread'] + self.expressions
+                writer = csv.DictWriter(fh, fields)
+                if fh.tell() == 0:
+                    writer.writeheader()
+                for record in self.pending:
+                    writer.writerow(dict((k, flatten(v))
+                                         for (k, v) in record.items()))
+            else:
+                for record in self.pending:
+                    fh.write(json.dumps(record) + '\n')
+        written = len(self.pending)
+        self.pending = []
+        return written
+
+    def describe(self):
+        return '%d: %s [%s] %d hits, %d errors, %d dropped, %.3fms/hit%s' % (
+               self.number, self.location, ', '.join(self.expressions),
+               self.hits, self.errors, self.dropped,
+               1000 * self.seconds / self.hits if self.hits else 0,
+               ' -> %s' % self.path if self.path else '')
+
+# breakpoint number -> TraceBreakpoint, survives reloads
+try:
+    traces
+except NameError:
+    traces = collections.OrderedDict()
+
+def trace(location, expressions, path=None, ring_size=RING_SIZE):
+    bp = TraceBreakpoint(location, expressions, path, ring_size)
+    traces[bp.number] = bp
+    return bp
+
+def delete(number=None):
+    'Flushes and deletes one trace, or all of them'
+    numbers = [number] if number is not None else list(traces)
+    numbers = [n for n in numbers if n in traces]
+    for n in numbers:
+        bp = traces.pop(n)
+        bp.flush()
+        if bp.is_valid():
+            bp.delete()
+    return numbers
+
+def flush_all(event=None):
+    return sum(bp.flush() for bp in traces.values())
+
+# Don't lose the last partial batch when the inferior goes away
+try:              disconnect_flush()
+except NameError: pass
+
+gdb.events.exited.connect(flush_all)
+disconnect_flush = functools.partial(gdb.events.exited.disconnect, flush_all)
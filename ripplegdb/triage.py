@@ -0,0 +1,304 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import os
+import sys
+import json
+import hashlib
+import argparse
+import subprocess
+import collections
+import concurrent.futures
+
+# Ours
+from ripplegdb import corefile
+
+##################################### DOCS #####################################
+"""
+
+Batch triage of rippled cores, for when there are dozens a week:
+
+    ripplegdb-triage [-o DIR] [-j JOBS] BINARY CORE_DIR
+
+Each core is handed to its own `gdb -batch` (from a process pool), which
+writes a json signature of it:
+
+    - the crashing thread's stack (and signal)
+    - a summary of all threads, identical stacks grouped (see stacks.py)
+    - the ripple printed arguments of the crashing thread's top frames
+
+The cores are then clustered by the functions of their crashing stack, into
+DIR/index.json, biggest cluster first.
+
+Signatures are kept in DIR/signatures, named by the binary's build-id plus a
+hash sampled from the core, so reruns only process new cores.
+
+The host side doesn't need gdb, only the worker (write_signature) does.
+
+"""
+################################### CONSTANTS ##################################
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORE_PREFIXES = ('core', )
+
+# Cores are hashed from SAMPLES evenly spaced SAMPLE_SIZE chunks, and size
+SAMPLES = 16
+SAMPLE_SIZE = 64 * 1024
+
+# Frames of the crashing stack making up the cluster key
+CLUSTER_DEPTH = 8
+
+DEFAULT_ARG_FRAMES = 5
+DEFAULT_DEPTH = 64
+DEFAULT_TIMEOUT = 600
+
+##################################### KEYS #####################################
+
+def sampled_hash(path):
+    'A hash of the size and SAMPLES chunks of a file, quick for huge cores'
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as fh:
+        step = max(SAMPLE_SIZE, size // SAMPLES)
+        for offset in range(0, size, step)[:SAMPLES]:
+            fh.seek(offset)
+            digest.update(fh.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+def binary_build_id(path):
+    'The GNU build-id of an executable, or a sampled hash when it has none'
+    try:
+        elf = corefile.ElfFile(path)
+    except corefile.ElfError:
+        elf = None
+    if elf is not None:
+        try:
+            build_id = elf.build_id()
+        finally:
+            elf.close()
+        if build_id:
+            return build_id
+    return 'sha1-' + sampled_hash(path)
+
+def core_key(build_id, core_path):
+    return '%s-%s' % (build_id, sampled_hash(core_path)[:16])
+
+def find_cores(paths):
+    'Core files in (or given as) paths'
+    found = []
+    for path in paths:
+        if os.path.isfile(path):
+            found.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            full = os.path.join(path, name)
+            if os.path.isfile(full) and (name.startswith(CORE_PREFIXES) or
+                                         name.endswith('.core')):
+                found.append(full)
+    return found
+
+#################################### WORKER ####################################
+
+def frame_args(frame):
+    '[(name, printed)] of the arguments of a gdb.Frame'
+    import gdb
+    try:
+        block = frame.block()
+    except RuntimeError:
+        return []
+    while block is not None and block.function is None:
+        block = block.superblock
+    if block is None:
+        return []
+
+    args = []
+    for sym in block:
+        if not sym.is_argument:
+            continue
+        try:
+            printed = str(sym.value(frame))
+        except (gdb.error, gdb.MemoryError) as e:
+            printed = '<error: %s>' % e
+        args.append((sym.print_name, printed))
+    return args
+
+def crash_signal():
+    import gdb
+    try:
+        return int(gdb.parse_and_eval('$_siginfo.si_signo'))
+    except (gdb.error, RuntimeError):
+        return None
+
+def signature(arg_frames=DEFAULT_ARG_FRAMES, depth=DEFAULT_DEPTH):
+    'The signature of the core gdb is debugging, see DOCS'
+    import gdb
+    from ripplegdb import stacks
+
+    # gdb selects the thread that got the signal when it loads a core
+    crashed = gdb.selected_thread()
+    pcs = stacks.pc_chain(depth)
+
+    frames = []
+    for (i, frame) in enumerate(stacks.frames(arg_frames)):
+        frames.append(dict(level=i,
+                           function=stacks.function_name(pcs[i])
+                                    if i < len(pcs) else None,
+                           args=frame_args(frame)))
+
+    threads = [dict(count=len(threads),
+                    threads=[t.num for t in threads],
+                    stack=[stacks.function_name(pc) for pc in group_pcs])
+               for (group_pcs, threads)
+               in stacks.group_stacks(stacks.thread_stacks(depth))]
+
+    return dict(signal=crash_signal(),
+                thread=crashed.num if crashed is not None else None,
+                stack=[dict(zip(('function', 'file', 'line'),
+                                stacks.symbolize(pc)), pc='0x%x' % pc.pc)
+                       for pc in pcs],
+                frames=frames,
+                threads=threads)
+
+def write_signature(out_path, arg_frames=DEFAULT_ARG_FRAMES,
+                    depth=DEFAULT_DEPTH):
+    'Run inside gdb, by each worker'
+    import gdb
+    for setting in ('set pagination off', 'set width 0', 'set height 0',
+                    'set print elements 200'):
+        gdb.execute(setting)
+    with open(out_path + '.tmp', 'w') as fh:
+        json.dump(signature(arg_frames, depth), fh, indent=2)
+    os.replace(out_path + '.tmp', out_path)
+
+def triage_core(gdb_path, binary, core, out_path, arg_frames, depth,
+                timeout):
+    'Runs one gdb over core, returning (core, error or None)'
+    write = 'import ripplegdb.triage; ripplegdb.triage.write_signature' \
+            '(%r, %d, %d)' % (out_path, arg_frames, depth)
+    argv = [gdb_path, '-batch', '-nx',
+            '-ex', 'python import sys; sys.path.insert(0, %r)' %
+                   PACKAGE_PARENT,
+            '-ex', 'python import ripplegdb',
+            '-ex', 'python ' + write,
+            binary, core]
+    if os.path.exists(out_path):
+        # Reprocessing (--force), don't mistake the old one for success
+        os.remove(out_path)
+    try:
+        done = subprocess.run(argv, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return (core, 'timed out after %ds' % timeout)
+    if not os.path.exists(out_path):
+        lines = done.stderr.decode('utf8', 'replace').strip().splitlines()
+        return (core, lines[-1] if lines else 'exit %d' % done.returncode)
+    return (core, None)
+
+################################## CLUSTERING ##################################
+
+def cluster_key(sig):
+    'The signal and top CLUSTER_DEPTH functions, unsymbolized ones as ??'
+    functions = [f['function'] if not f['function'].startswith('0x')
+                 else '??' for f in sig['stack'][:CLUSTER_DEPTH]]
+    return (sig['signal'], tuple(functions))
+
+def build_index(sig_dir, cores_by_key):
+    'Clusters every signature in sig_dir, biggest first'
+    clusters = collections.OrderedDict()
+    for name in sorted(os.listdir(sig_dir)):
+        if not name.endswith('.json'):
+            continue
+        key = name[:-len('.json')]
+        with open(os.path.join(sig_dir, name)) as fh:
+            sig = json.load(fh)
+        (signal, functions) = cluster_key(sig)
+        cluster = clusters.setdefault((signal, functions), dict(
+            signal=signal, stack=list(functions), cores=[]))
+        cluster['cores'].append(dict(key=key,
+                                     path=cores_by_key.get(key),
+                                     signature=os.path.join(sig_dir, name)))
+
+    ordered = sorted(clusters.values(), key=lambda c: -len(c['cores']))
+    for (i, cluster) in enumerate(ordered):
+        cluster['id'] = i
+        cluster['count'] = len(cluster['cores'])
+    return ordered
+
+def write_index(path, index):
+    with open(path + '.tmp', 'w') as fh:
+        json.dump(index, fh, indent=2)
+    os.replace(path + '.tmp', path)
+
+##################################### MAIN #####################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='ripplegdb-triage',
+        description='Signatures and clusters of many rippled cores')
+    parser.add_argument('binary')
+    parser.add_argument('cores', nargs='+',
+                        help='core files, or directories of them')
+    parser.add_argument('-o', '--out',
+                        help='output directory (default CORE_DIR/triage)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--gdb', default='gdb')
+    parser.add_argument('--frames', type=int, default=DEFAULT_ARG_FRAMES,
+                        help='top frames whose arguments are printed')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH)
+    parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT,
+                        help='seconds per core')
+    parser.add_argument('--force', action='store_true',
+                        help='reprocess cores already triaged')
+    args = parser.parse_args(argv)
+
+    out = args.out or os.path.join(
+        args.cores[0] if os.path.isdir(args.cores[0])
+        else os.path.dirname(os.path.abspath(args.cores[0])), 'triage')
+    sig_dir = os.path.join(out, 'signatures')
+    os.makedirs(sig_dir, exist_ok=True)
+
+    build_id = binary_build_id(args.binary)
+    cores_by_key = {}
+    todo = []
+    for core in find_cores(args.cores):
+        key = core_key(build_id, core)
+        cores_by_key[key] = os.path.abspath(core)
+        sig_path = os.path.join(sig_dir, key + '.json')
+        if args.force or not os.path.exists(sig_path):
+            todo.append((core, sig_path))
+
+    print('%d cores, %d already triaged' % (len(cores_by_key),
+                                            len(cores_by_key) - len(todo)))
+
+    failed = {}
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(triage_core, args.gdb,
+                               os.path.abspath(args.binary),
+                               os.path.abspath(core), sig_path,
+                               args.frames, args.depth, args.timeout)
+                   for (core, sig_path) in todo]
+        for future in concurrent.futures.as_completed(futures):
+            (core, error) = future.result()
+            print('%s %s' % ('failed' if error else 'done  ', core) +
+                  (': %s' % error if error else ''))
+            if error:
+                failed[core] = error
+
+    # Signatures of cores from earlier runs, no longer around, are kept too
+    index = dict(binary=os.path.abspath(args.binary),
+                 build_id=build_id,
+                 clusters=build_index(sig_dir, cores_by_key),
+                 failed=failed)
+    index_path = os.path.join(out, 'index.json')
+    write_index(index_path, index)
+
+    for cluster in index['clusters']:
+        print('%4d cores  signal %s  %s' % (
+              cluster['count'], cluster['signal'],
+              ' < '.join(cluster['stack'][:4])))
+    print('wrote', index_path)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,25 +1,80 @@
 #################################### IMPORTS ###################################
 
+# Std Lib
+import functools
+
+# Gdb
 import gdb
 
+# Ours
+import ripplegdb
+from ripplegdb.helpers import if_rippled
+
+################################## LAZY TYPES ##################################
+'''
+
+Looking up types in a full debug build of rippled is slow, so by default they
+are only resolved when first used, eg. when a matching value is printed.
+
+'''
+
+# name -> gdb.Type, survives module reloads but not a new objfile
+try:
+    resolved_types
+except NameError:
+    resolved_types = {}
+
+class LazyType:
+    'Stands in for gdb.lookup_type(name), delegating everything to it'
+
+    def __init__(self, name):
+        self.name = name
+
+    def resolve(self):
+        t = resolved_types.get(self.name)
+        if t is None:
+            t = resolved_types[self.name] = gdb.lookup_type(self.name)
+        return t
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return '<LazyType %s>' % self.name
+
+try:              disconnect_resolved_types()
+except NameError: pass
+
+@if_rippled
+def clear_resolved_types(event=None):
+    resolved_types.clear()
+
+gdb.events.new_objfile.connect(clear_resolved_types)
+disconnect_resolved_types = functools.partial(
+    gdb.events.new_objfile.disconnect, clear_resolved_types)
+
 ################################### CONSTANTS ##################################
 
-SerializedType = gdb.lookup_type("ripple::STBase")
-
-STAmount = gdb.lookup_type("ripple::STAmount")
-STHash256 = gdb.lookup_type("ripple::STBitString<256ul>")
-STHash160 = gdb.lookup_type("ripple::STBitString<160ul>")
-STAccount = gdb.lookup_type("ripple::STAccount")
-STHash128 = gdb.lookup_type("ripple::STBitString<128ul>")
-STUInt64 = gdb.lookup_type("ripple::STUInt64")
-STUInt32 = gdb.lookup_type("ripple::STUInt32")
-STUInt16 = gdb.lookup_type("ripple::STUInt16")
-STUInt8 = gdb.lookup_type("ripple::STUInt8")
-STObject  =  gdb.lookup_type('ripple::STObject')
-STArray  =  gdb.lookup_type('ripple::STArray')
-STPathSet  =  gdb.lookup_type('ripple::STPathSet')
-STVector256  =  gdb.lookup_type('ripple::STVector256')
-STBlob = gdb.lookup_type("ripple::STBlob")
+SerializedType = LazyType("ripple::STBase")
+SField = LazyType("ripple::SField")
+
+STAmount = LazyType("ripple::STAmount")
+STHash256 = LazyType("ripple::STBitString<256ul>")
+STHash160 = LazyType("ripple::STBitString<160ul>")
+STAccount = LazyType("ripple::STAccount")
+STHash128 = LazyType("ripple::STBitString<128ul>")
+STUInt64 = LazyType("ripple::STUInt64")
+STUInt32 = LazyType("ripple::STUInt32")
+STUInt16 = LazyType("ripple::STUInt16")
+STUInt8 = LazyType("ripple::STUInt8")
+STObject  =  LazyType('ripple::STObject')
+STArray  =  LazyType('ripple::STArray')
+STPathSet  =  LazyType('ripple::STPathSet')
+STVector256  =  LazyType('ripple::STVector256')
+STBlob = LazyType("ripple::STBlob")
 
 STI_TO_TYPE_MAPPING = {
     'ripple::STI_UINT8':     STUInt8,
@@ -38,6 +93,10 @@ STI_TO_TYPE_MAPPING = {
     'ripple::STI_VECTOR256': STVector256
 }
 
+if not ripplegdb.LAZY:
+    for t in [SerializedType] + list(STI_TO_TYPE_MAPPING.values()):
+        t.resolve()
+
 CODE_LOOKUP = dict([ (getattr(gdb, k), k) for k in dir(gdb) if
                    k.startswith('TYPE_CODE_')])
 
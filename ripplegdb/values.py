@@ -1,19 +1,444 @@
 #################################### IMPORTS ###################################
 
+# Std Lib
+import re
+import itertools
+import functools
+import collections
+
+# Gdb
 import gdb
 
+# Ours
+from ripplegdb.helpers import if_rippled
+
+################################### CONSTANTS ##################################
+
+# Element types which can be rebuilt from their raw bytes via a cast, rather
+# than dereferencing a pointer into the inferior for each one.
+SCALAR_CODES = frozenset([gdb.TYPE_CODE_INT,
+                          gdb.TYPE_CODE_CHAR,
+                          gdb.TYPE_CODE_BOOL,
+                          gdb.TYPE_CODE_ENUM,
+                          gdb.TYPE_CODE_PTR])
+
+SIGNED_FORMATS = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+UNSIGNED_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+PAGE_SIZE = 4096
+PAGE_MASK = ~(PAGE_SIZE - 1)
+
+# 64MB of pages, least recently used evicted past that
+MAX_PAGES = 16384
+
+# Pages probed to find which one made a multi page read fail
+MAX_PROBED_PAGES = 16
+
+ADDRESS_RX = re.compile(r'0x[0-9a-fA-F]+')
+
+################################## PAGE CACHE ##################################
+
+# Generations count on across reloads (and so across PageCaches), a
+# generation held onto from an old cache must never match the new one's
+try:              generations
+except NameError: generations = itertools.count(1)
+
+class PageCache:
+    '''
+
+    Page granular cache of inferior memory, keyed by (inferior, pid, page).
+
+    Memory can only change while the inferior runs, or is written to by the
+    user, so everything is dropped on stop/cont/memory_changed (and friends).
+    Until then, repeated prints of the same values only hit the target once
+    per page. Bounded to max_pages, evicting the least recently used.
+
+    Pages which failed to read are remembered (for the same generation) too,
+    so the dangling pointers of a crashed process fail without going to the
+    target again.
+
+    '''
+    def __init__(self, max_pages=MAX_PAGES):
+        self.pages = collections.OrderedDict()
+        self.max_pages = max_pages
+        self.unreadable = set()
+        self.enabled = True
+        self.generation = next(generations)
+        self.hits = self.misses = self.bypassed = self.evictions = 0
+        self.short_circuited = 0
+
+    def clear(self, event=None):
+        self.pages.clear()
+        self.unreadable.clear()
+        self.generation = next(generations)
+
+    def reset_stats(self):
+        self.hits = self.misses = self.bypassed = self.evictions = 0
+        self.short_circuited = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return dict(pages=len(self.pages),
+                    unreadable=len(self.unreadable),
+                    generation=self.generation,
+                    hits=self.hits,
+                    misses=self.misses,
+                    bypassed=self.bypassed,
+                    evictions=self.evictions,
+                    short_circuited=self.short_circuited,
+                    hit_rate=(self.hits / total) if total else 0.0)
+
+    def check_readable(self, address, n):
+        'Raises gdb.MemoryError, without a target read, for known bad pages'
+        if not self.unreadable:
+            return
+        inferior = gdb.selected_inferior()
+        prefix = (inferior.num, inferior.pid)
+        first = address & PAGE_MASK
+        last = (address + n - 1) & PAGE_MASK
+
+        # A garbage n can span far more pages than are known to be bad
+        if (last - first) // PAGE_SIZE < len(self.unreadable):
+            bad = [p for p in range(first, last + 1, PAGE_SIZE)
+                   if prefix + (p, ) in self.unreadable]
+        else:
+            bad = sorted(k[-1] for k in self.unreadable
+                         if k[:-1] == prefix and first <= k[-1] <= last)
+        if bad:
+            self.short_circuited += 1
+            raise gdb.MemoryError('Cannot access memory at address 0x%x' %
+                                  max(bad[0], address))
+
+    def mark_unreadable(self, address, n):
+        'Remembers the page which made the read of [address, address + n) fail'
+        inferior = gdb.selected_inferior()
+        prefix = (inferior.num, inferior.pid)
+        first = address & PAGE_MASK
+        last = (address + n - 1) & PAGE_MASK
+
+        if first == last:
+            self.unreadable.add(prefix + (first, ))
+            return
+
+        # Otherwise find the first bad page, if it's near enough
+        for page in range(first, last + 1, PAGE_SIZE)[:MAX_PROBED_PAGES]:
+            key = prefix + (page, )
+            if key in self.pages:
+                continue
+            try:
+                data = direct_read(inferior, page, PAGE_SIZE)
+            except gdb.MemoryError:
+                self.unreadable.add(key)
+                return
+            if self.enabled:
+                self.store(key, data)
+
+    def read(self, address, n):
+        inferior = gdb.selected_inferior()
+        prefix = (inferior.num, inferior.pid)
+        first = address & PAGE_MASK
+        last = (address + n - 1) & PAGE_MASK
+
+        if first == last:
+            page = self.page(inferior, prefix, first)
+            if page is None:
+                self.bypassed += 1
+                return direct_read(inferior, address, n)
+            offset = address - first
+            return page[offset:offset + n]
+
+        keys = [prefix + (p, ) for p in range(first, last + 1, PAGE_SIZE)]
+        pages = [self.pages.get(k) for k in keys]
+
+        if all(p is not None for p in pages):
+            self.hits += len(pages)
+            for key in keys:
+                self.pages.move_to_end(key)
+            offset = address - first
+            return memoryview(b''.join(pages))[offset:offset + n]
+
+        # Read every page spanned in one go, so the straddled first and last
+        # are kept too, unless they're unmapped, then just the exact range
+        self.misses += len(pages)
+        try:
+            start = first
+            data = direct_read(inferior, first, last + PAGE_SIZE - first)
+        except gdb.MemoryError:
+            start = address
+            data = direct_read(inferior, address, n)
+
+        # Copies, as a slice would keep the whole read alive in the cache
+        for key in keys:
+            offset = key[-1] - start
+            if offset >= 0 and offset + PAGE_SIZE <= len(data):
+                self.store(key, memoryview(
+                    bytes(data[offset:offset + PAGE_SIZE])))
+        offset = address - start
+        return data[offset:offset + n]
+
+    def page(self, inferior, prefix, page):
+        key = prefix + (page, )
+        data = self.pages.get(key)
+        if data is not None:
+            self.hits += 1
+            self.pages.move_to_end(key)
+            return data
+
+        self.misses += 1
+        try:
+            data = direct_read(inferior, page, PAGE_SIZE)
+        except gdb.MemoryError:
+            # Probably the end of a mapping, let the caller do an exact read
+            return None
+        self.store(key, data)
+        return data
+
+    def store(self, key, data):
+        self.pages[key] = data
+        self.pages.move_to_end(key)
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+            self.evictions += 1
+
+def direct_read(inferior, address, n):
+    return memoryview(inferior.read_memory(address, n)).cast('B')
+
+INVALIDATING_EVENTS = ('stop', 'cont', 'exited', 'memory_changed',
+                       'inferior_call', 'new_objfile')
+
+def connect_invalidation(cache):
+    events = [getattr(gdb.events, e) for e in INVALIDATING_EVENTS
+              if hasattr(gdb.events, e)]
+    for event in events:
+        event.connect(cache.clear)
+
+    def disconnect():
+        for event in events:
+            event.disconnect(cache.clear)
+    return disconnect
+
+# Don't leave the previous module's cache connected after a reload
+try:              disconnect_page_cache()
+except NameError: pass
+
+page_cache = PageCache()
+disconnect_page_cache = connect_invalidation(page_cache)
+
+try:              disconnect_field_offsets()
+except NameError: pass
+
+@if_rippled
+def clear_field_offsets(event=None):
+    field_offsets.clear()
+    sizes.clear()
+
+gdb.events.new_objfile.connect(clear_field_offsets)
+disconnect_field_offsets = functools.partial(
+    gdb.events.new_objfile.disconnect, clear_field_offsets)
+
+################################# CORE BACKEND #################################
+
+# An optional corefile.CoreFile, serving reads from an mmap of the core gdb is
+# debugging (see the `rcore` command), and the pid of the inferior it's for.
+try:
+    core_backend
+except NameError:
+    core_backend = core_pid = None
+
+def set_core_backend(core):
+    global core_backend, core_pid
+    if core_backend is not None and core_backend is not core:
+        core_backend.close()
+    core_backend = core
+    core_pid = None if core is None else gdb.selected_inferior().pid
+
+# Called with the size of every read_memory, when set (see stats.py)
+try:
+    on_read
+except NameError:
+    on_read = None
+
 #################################### HELPERS ###################################
 
+def read_memory(address, n):
+    if n <= 0:
+        return memoryview(b'')
+    if on_read is not None:
+        on_read(n)
+    if core_backend is not None:
+        if gdb.selected_inferior().pid == core_pid:
+            data = core_backend.read(address, n)
+            if data is not None:
+                return data
+        else:
+            # Some other target now, so it's no use to us
+            set_core_backend(None)
+
+    page_cache.check_readable(address, n)
+    try:
+        if page_cache.enabled:
+            return page_cache.read(address, n)
+        return direct_read(gdb.selected_inferior(), address, n)
+    except gdb.MemoryError:
+        page_cache.mark_unreadable(address, n)
+        raise
+
+def unreadable(e, address=None):
+    'The marker printed for a value, when reading it raised gdb.MemoryError e'
+    match = ADDRESS_RX.search(str(e))
+    return '<unreadable %s>' % (match.group(0) if match else
+                                '0x%x' % (address or 0))
+
+def print_elements():
+    "gdb's `set print elements`, or None when it's unlimited"
+    return gdb.parameter('print elements') or None
+
 def read_value(val, n=None):
-    return (gdb.selected_inferior()
-               .read_memory(
-                    val.address, n or val.type.sizeof))
+    return read_memory(int(val.address), n or val.type.sizeof)
+
+def read_uint(address, size):
+    return read_memory(address, size).cast(UNSIGNED_FORMATS[size])[0]
+
+def pointer_size():
+    try:
+        return sizes['pointer']
+    except KeyError:
+        size = sizes['pointer'] = gdb.lookup_type('void').pointer().sizeof
+        return size
+
+def read_pointer(address):
+    return read_uint(address, pointer_size())
+
+# (type name, field name) -> (byte offset, size), and the pointer size.
+# Survive reloads but not a new rippled objfile.
+try:
+    field_offsets
+except NameError:
+    field_offsets = {}
+
+try:
+    sizes
+except NameError:
+    sizes = {}
+
+def find_field(t, name):
+    '(byte offset, type) of field `name` of t, looking through base classes'
+    for f in t.strip_typedefs().fields():
+        if f.name == name:
+            return (f.bitpos // 8, f.type)
+        if f.is_base_class:
+            found = find_field(f.type, name)
+            if found is not None:
+                return (f.bitpos // 8 + found[0], found[1])
+
+def field_spec(t, name):
+    key = (str(t), name)
+    spec = field_offsets.get(key)
+    if spec is None:
+        found = find_field(t, name)
+        if found is None:
+            raise KeyError('%s has no field %s' % (t, name))
+        spec = field_offsets[key] = (found[0], found[1].sizeof)
+    return spec
+
+def field_offset(t, name):
+    return field_spec(t, name)[0]
+
+class InvalidSize(ValueError):
+    'A container whose size is garbage, str() is the marker to print for it'
 
-def read_blob(val):
-    return bytes(map(int, iterate_vector(val)))
+def read_blob(val, max_size=0):
+    '''
+
+    The bytes of a std::vector<unsigned char> (ie. a ripple::Blob).
+
+    Raises InvalidSize rather than reading when the size is past the capacity,
+    or max_size (0 is unlimited), as in a corrupted or dangling blob.
+
+    '''
+    blob = VectorView(val)
+    if not blob.valid() or (max_size and blob.count > max_size):
+        raise InvalidSize('<invalid blob size %d>' % blob.count)
+    return bytes(blob.raw)
 
 def iterate_vector(vec):
-    impl = vec['_M_impl']
-    start = impl['_M_start']
-    for i in range(int(impl['_M_finish'] - start)):
-        yield (start + i).dereference()
+    return iter(VectorView(vec))
+
+################################## BULK READS ##################################
+
+class VectorView:
+    '''
+
+    The [_M_start, _M_finish) range of a std::vector, fetched with a single
+    read_memory the first time `raw` is touched.
+
+    `raw` is a zero-copy memoryview over the whole element buffer, and
+    `item_bytes(i)` slices it per element. gdb.Value objects are only built
+    when indexed or iterated, scalars from the buffer and anything else as a
+    (lazy) dereference of the element's address.
+
+    '''
+    def __init__(self, vec):
+        impl = self.impl = vec['_M_impl']
+        self.start = impl['_M_start']
+        self.type = self.start.type.strip_typedefs().target()
+        self.itemsize = self.type.sizeof
+        self.address = int(self.start)
+        self.count = int(impl['_M_finish'] - self.start)
+        self._raw = None
+
+        basic = self.type.strip_typedefs()
+        self.format = (UNSIGNED_FORMATS.get(self.itemsize)
+                       if basic.code in SCALAR_CODES else None)
+
+    @property
+    def nbytes(self):
+        return self.count * self.itemsize
+
+    @property
+    def capacity(self):
+        return int(self.impl['_M_end_of_storage'] - self.start)
+
+    def valid(self):
+        'Whether the size could be real, ie. within the capacity'
+        return 0 <= self.count <= self.capacity
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            self._raw = read_memory(self.address, self.nbytes)
+        return self._raw
+
+    def item_bytes(self, i):
+        offset = i * self.itemsize
+        return self.raw[offset:offset + self.itemsize]
+
+    def scalars(self):
+        'The elements as python ints, only valid when `format` is set'
+        return self.raw.cast(self.format)
+
+    def limit(self, count):
+        'Only view (and read) the first count elements'
+        if count < self.count:
+            self.count = count
+            self._raw = None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        if self.format is not None:
+            return gdb.Value(self.scalars()[i]).cast(self.type)
+        return (self.start + i).dereference()
+
+    def __iter__(self):
+        if self.format is not None:
+            for n in self.scalars():
+                yield gdb.Value(n).cast(self.type)
+        else:
+            for i in range(self.count):
+                yield (self.start + i).dereference()
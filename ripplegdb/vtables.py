@@ -0,0 +1,260 @@
+#################################### IMPORTS ###################################
+
+# Std Lib
+import os
+import re
+import bisect
+import functools
+import tempfile
+
+# Gdb
+import gdb
+
+# Ours
+from ripplegdb import diskcache
+from ripplegdb.helpers import rippled_objfile, if_rippled
+from ripplegdb.values import read_memory, read_pointer, pointer_size
+from ripplegdb.memscan import annotators
+
+##################################### DOCS #####################################
+"""
+
+An index of every `vtable for ripple::*` address, so the dynamic type of a
+polymorphic ripple object (STBase, SLE, STTx, Job ...) is one pointer read,
+and a dict lookup, away.
+
+Under the Itanium ABI an object's (primary) vptr points 2 words into its
+class's vtable, past offset-to-top and the typeinfo pointer. Vptrs of
+secondary bases point further in, and are found by bisecting the sorted
+vtable addresses, with offset-to-top giving the start of the full object.
+Each vtable is taken to end where the next msymbol (of any kind) starts, so
+a vptr past it, eg. into another library's vtable, isn't taken for ripple's.
+
+The index is built from `maint print msymbols`, once per build (it's kept in
+the diskcache, relative to an anchor vtable, as PIE binaries move about).
+
+"""
+################################### CONSTANTS ##################################
+
+PREFIX = 'ripple::'
+
+# [index] type address linkage-name [section .x] [demangled] [  filename]
+MSYMBOL_RX = re.compile(r'^\[\s*\d+\]\s+\S\s+(0x[0-9a-f]+)\s+(\S+)(.*)$')
+
+# How far before an address we look for the vptr of an object holding it
+OWNER_SEARCH_BYTES = 512
+
+# Bound on a vtable's size, for one with no msymbol after it
+MAX_VTABLE_BYTES = 8192
+
+################################## BUILDING ####################################
+
+def msymbol_vtables(objfile):
+    '''
+
+    [(class name, vtable address, size)] for ripple classes, from the
+    msymbols. The dump has no sizes, so a vtable ends at the next msymbol.
+
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'msymbols')
+        gdb.execute("maint print msymbols -objfile '%s' %s" % (
+                    objfile.filename, path), to_string=True)
+        found = []
+        addresses = set()
+        with open(path) as fh:
+            for line in fh:
+                match = MSYMBOL_RX.match(line)
+                if match is None:
+                    continue
+                address = int(match.group(1), 16)
+                addresses.add(address)
+                if 'vtable for ' + PREFIX in line:
+                    rest = match.group(3).split('vtable for ', 1)[1]
+                    found.append((rest.split('  ')[0].strip(), address))
+
+    addresses = sorted(addresses)
+    spans = []
+    for (name, address) in found:
+        i = bisect.bisect_right(addresses, address)
+        end = addresses[i] if i < len(addresses) else address
+        size = end - address
+        spans.append((name, address, size if 0 < size < MAX_VTABLE_BYTES
+                                          else MAX_VTABLE_BYTES))
+    return spans
+
+def vtable_address(name):
+    return int(gdb.parse_and_eval("(unsigned long)&'vtable for %s'" % name))
+
+def cached_vtables():
+    '''
+
+    [(class name, vtable address, size)], from the diskcache when we can.
+    Stored addresses are relocated by how far the first (anchor) vtable has
+    moved.
+
+    '''
+    objfile = rippled_objfile()
+    if objfile is None:
+        return []
+
+    stored = diskcache.cached('vtable_spans',
+                              lambda: msymbol_vtables(objfile))
+    if not stored:
+        return []
+
+    (anchor, anchored_at, _) = stored[0]
+    try:
+        delta = vtable_address(anchor) - anchored_at
+    except gdb.error:
+        delta = 0
+    return [(name, address + delta, size)
+            for (name, address, size) in stored]
+
+#################################### INDEX #####################################
+
+class VtableIndex:
+    '''
+
+    vptr -> class name (and gdb.Type, resolved on first use).
+
+    '''
+    def __init__(self, vtables):
+        offset = 2 * pointer_size()
+        self.by_vptr = {address + offset: name
+                        for (name, address, _) in vtables}
+        ordered = sorted((address, size, name)
+                         for (name, address, size) in vtables)
+        self.starts = [address for (address, _, _) in ordered]
+        self.ends = [address + size for (address, size, _) in ordered]
+        self.names = [name for (_, _, name) in ordered]
+        self.types = {}
+
+    def __len__(self):
+        return len(self.by_vptr)
+
+    def class_name(self, vptr):
+        'The class of the vtable vptr points into, or None'
+        name = self.by_vptr.get(vptr)
+        if name is None and self.starts:
+            i = bisect.bisect_right(self.starts, vptr - 2 * pointer_size()) - 1
+            if i >= 0 and vptr < self.ends[i]:
+                name = self.names[i]
+        return name
+
+    def is_primary(self, vptr):
+        return vptr in self.by_vptr
+
+    def type_of(self, vptr):
+        name = self.class_name(vptr)
+        if name is None:
+            return None
+        try:
+            return self.types[name]
+        except KeyError:
+            pass
+        try:
+            t = gdb.lookup_type(name)
+        except gdb.error:
+            t = None
+        self.types[name] = t
+        return t
+
+    def dynamic_type(self, address):
+        '''
+
+        (gdb.Type, full object address) of the polymorphic object at address,
+        or None when its vptr isn't a ripple one.
+
+        '''
+        vptr = read_pointer(address)
+        t = self.type_of(vptr)
+        if t is None:
+            return None
+        if not self.is_primary(vptr):
+            # A secondary base, offset-to-top is 2 words before the vptr
+            ptr = pointer_size()
+            top = int.from_bytes(read_memory(vptr - 2 * ptr, ptr), 'little',
+                                 signed=True)
+            address += top
+        return (t, address)
+
+    def owner_of(self, address, search=OWNER_SEARCH_BYTES):
+        '''
+
+        (class name, object address) of the nearest object, at or before
+        address, with a primary ripple vptr and which is big enough to span
+        address, or None.
+
+        '''
+        ptr = pointer_size()
+        start = max(0, (address - search) & ~(ptr - 1))
+        try:
+            words = read_memory(start, address + ptr - start)
+        except gdb.MemoryError:
+            return None
+        words = words[:len(words) - len(words) % ptr].cast('Q' if ptr == 8
+                                                           else 'I')
+        for i in range(len(words) - 1, -1, -1):
+            name = self.by_vptr.get(words[i])
+            if name is not None:
+                t = self.type_of(words[i])
+                candidate = start + i * ptr
+                if t is None or candidate + t.sizeof > address:
+                    return (name, candidate)
+
+# Built on first use, survives reloads but not a new rippled objfile
+try:
+    index
+except NameError:
+    index = None
+
+def vtable_index():
+    global index
+    if index is None:
+        index = VtableIndex(cached_vtables())
+    return index
+
+def dynamic_type(val):
+    '(gdb.Type, address) for a pointer to, reference to, or polymorphic value'
+    if val.type.code == gdb.TYPE_CODE_PTR:
+        address = int(val)
+    else:
+        if val.type.code == gdb.TYPE_CODE_REF:
+            val = val.referenced_value()
+        address = int(val.address)
+    return vtable_index().dynamic_type(address)
+
+def downcast(val):
+    'The object val points to (or is), as its dynamic ripple type'
+    found = dynamic_type(val)
+    if found is None:
+        return val.dereference() if val.type.code == gdb.TYPE_CODE_PTR else val
+    (t, address) = found
+    return gdb.Value(address).cast(t.pointer()).dereference()
+
+try:              disconnect_index()
+except NameError: pass
+
+@if_rippled
+def clear_index(event=None):
+    global index
+    index = None
+
+gdb.events.new_objfile.connect(clear_index)
+disconnect_index = functools.partial(gdb.events.new_objfile.disconnect,
+                                     clear_index)
+
+################################## ANNOTATION ##################################
+
+def owner_annotator(address):
+    if not len(vtable_index()):
+        return None
+    owner = vtable_index().owner_of(address)
+    if owner is not None:
+        (name, start) = owner
+        return '%s at 0x%x +%d' % (name, start, address - start)
+
+# Replace, rather than add, any owner_annotator of a previous load
+annotators[:] = [a for a in annotators if a.__name__ != 'owner_annotator']
+annotators.append(owner_annotator)
@@ -133,5 +133,10 @@ setup(
         "Framework :: Django",
     ],
     zip_safe=False,
+    entry_points={
+        "console_scripts": [
+            "ripplegdb-triage = ripplegdb.triage:main",
+        ],
+    },
 )
 